@@ -1,13 +1,11 @@
 import pygame
 import sys
 
-# Initialize Pygame
-pygame.init()
+from render import render_text
+from widgets import Button
 
 # Screen settings
 SCREEN_WIDTH, SCREEN_HEIGHT = 800, 600
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Capture The Flag")
 
 # Colors
 WHITE = (255, 255, 255)
@@ -16,9 +14,20 @@ BLUE = (0, 0, 255)
 BLACK = (0, 0, 0)
 GRAY = (150, 150, 150)
 
-# Load clock
-clock = pygame.time.Clock()
-font = pygame.font.Font(None, 40)
+# Window, clock and font, created on first display (video and font only)
+screen = None
+clock = None
+font = None
+
+def init_display():
+    global screen, clock, font
+    if screen is None:
+        pygame.display.init()
+        pygame.font.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Capture The Flag")
+        clock = pygame.time.Clock()
+        font = pygame.font.Font(None, 40)
 
 # Player speed
 PLAYER_SPEED = 3
@@ -28,45 +37,25 @@ def keep_inside_window(player):
     player.x = max(0, min(player.x, SCREEN_WIDTH - player.width))
     player.y = max(0, min(player.y, SCREEN_HEIGHT - player.height))
 
-# Button Class
-class Button:
-    def __init__(self, text, x, y, width, height, color, hover_color, action):
-        self.text = text
-        self.rect = pygame.Rect(x, y, width, height)
-        self.color = color
-        self.hover_color = hover_color
-        self.action = action
-
-    def draw(self):
-        mouse_pos = pygame.mouse.get_pos()
-        pygame.draw.rect(screen, self.hover_color if self.rect.collidepoint(mouse_pos) else self.color, self.rect)
-        text_surface = font.render(self.text, True, BLACK)
-        text_rect = text_surface.get_rect(center=self.rect.center)
-        screen.blit(text_surface, text_rect)
-
-    def check_click(self, event):
-        if event.type == pygame.MOUSEBUTTONDOWN and self.rect.collidepoint(event.pos):
-            self.action()
-
 # Function to show victory screen
 def victory_screen(winner):
-    play_again_button = Button("PLAY AGAIN", 300, 300, 200, 50, GRAY, RED, start_game)
-    quit_button = Button("QUIT", 300, 400, 200, 50, GRAY, RED, quit_game)
+    play_again_button = Button((300, 300, 200, 50), "PLAY AGAIN", start_game, (GRAY, BLACK, RED, None))
+    quit_button = Button((300, 400, 200, 50), "QUIT", quit_game, (GRAY, BLACK, RED, None))
 
     while True:
         screen.fill(WHITE)
-        victory_text = font.render(f"{winner} Wins!", True, BLACK)
+        victory_text = render_text(font, f"{winner} Wins!", BLACK)
         screen.blit(victory_text, (SCREEN_WIDTH // 2 - 80, 150))
 
-        play_again_button.draw()
-        quit_button.draw()
+        play_again_button.draw(screen, font)
+        quit_button.draw(screen, font)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
-            play_again_button.check_click(event)
-            quit_button.check_click(event)
+            play_again_button.handle_event(event)
+            quit_button.handle_event(event)
 
         pygame.display.flip()
         clock.tick(60)
@@ -77,6 +66,8 @@ def start_game():
     global score_p1, score_p2, holder_p1, holder_p2, flag1_captured, flag2_captured
     global obstacles
 
+    init_display()
+
     # Reset game variables
     player1 = pygame.Rect(100, 300, 50, 50)
     player2 = pygame.Rect(650, 300, 50, 50)
@@ -190,7 +181,7 @@ def start_game():
             pygame.draw.rect(screen, BLACK, obs)
 
         # Display Scores
-        score_text = font.render(f"P1 Score: {score_p1}   P2 Score: {score_p2}", True, BLACK)
+        score_text = render_text(font, f"P1 Score: {score_p1}   P2 Score: {score_p2}", BLACK)
         screen.blit(score_text, (300, 20))
 
         # Check for Win Condition
@@ -210,4 +201,5 @@ def quit_game():
     sys.exit()
 
 # Start the game
-start_game()
+if __name__ == "__main__":
+    start_game()
@@ -0,0 +1,214 @@
+import argparse
+import time
+
+import numpy as np
+
+from levels import SCREEN_WIDTH, SCREEN_HEIGHT, LEVEL_OBSTACLES
+from sim import UP, DOWN, LEFT, RIGHT, WINNING_SCORE, PLAYER_SIZE, MatchState, step
+
+# Rect columns
+X, Y, W, H = 0, 1, 2, 3
+
+# Same test as pygame.Rect.colliderect for non-empty rects
+def _collide(ax, ay, aw, ah, bx, by, bw, bh):
+    return (ax < bx + bw) & (ay < by + bh) & (ax + aw > bx) & (ay + ah > by)
+
+# Same test as pygame.Rect.contains (outer contains inner)
+def _contains(outer, x, y, size):
+    return ((outer[:, X] <= x) & (outer[:, Y] <= y) &
+            (x + size <= outer[:, X] + outer[:, W]) & (y + size <= outer[:, Y] + outer[:, H]))
+
+# N independent matches stored as arrays and stepped together. Follows the
+# rules of sim.step exactly, including the order in which pickups, scoring
+# and tagging are applied within a tick.
+class MatchBatch:
+    def __init__(self, levels, speed=3):
+        n = len(levels)
+        self.levels = list(levels)
+        names = sorted(set(self.levels))
+        index = {name: i for i, name in enumerate(names)}
+        self.level_index = np.array([index[name] for name in self.levels], dtype=np.int32)
+
+        # Obstacles padded to the largest level; padding slots are masked out
+        max_obs = max(len(LEVEL_OBSTACLES[name]) for name in names)
+        level_obs = np.zeros((len(names), max_obs, 4), dtype=np.int32)
+        level_valid = np.zeros((len(names), max_obs), dtype=bool)
+        for i, name in enumerate(names):
+            for j, obs in enumerate(LEVEL_OBSTACLES[name]):
+                level_obs[i, j] = tuple(obs)
+                level_valid[i, j] = True
+        self.obstacles = level_obs[self.level_index]
+        self.obstacle_valid = level_valid[self.level_index]
+
+        self.speed = np.broadcast_to(np.asarray(speed, dtype=np.int32), (n,)).copy()
+
+        # Static layout comes from the scalar match so both stay in sync
+        layouts = [MatchState(name) for name in names]
+        def gather(attr):
+            rects = np.array([tuple(getattr(layout, attr)) for layout in layouts], dtype=np.int32)
+            return rects[self.level_index]
+        self.base1 = gather("base1")
+        self.base2 = gather("base2")
+        self.flag1 = gather("flag1")
+        self.flag2 = gather("flag2")
+        self.start_p1 = gather("player1")
+        self.start_p2 = gather("player2")
+        self.p1x, self.p1y = self.start_p1[:, X].copy(), self.start_p1[:, Y].copy()
+        self.p2x, self.p2y = self.start_p2[:, X].copy(), self.start_p2[:, Y].copy()
+
+        self.flag1_captured = np.zeros(n, dtype=bool)
+        self.flag2_captured = np.zeros(n, dtype=bool)
+        self.holder_p1 = np.zeros(n, dtype=bool)
+        self.holder_p2 = np.zeros(n, dtype=bool)
+        self.score_p1 = np.zeros(n, dtype=np.int32)
+        self.score_p2 = np.zeros(n, dtype=np.int32)
+        self.tick = np.zeros(n, dtype=np.int64)
+
+    # Start the selected matches (boolean mask or indices; all if None) over
+    def reset(self, which=None):
+        which = slice(None) if which is None else which
+        self.p1x[which] = self.start_p1[which, X]
+        self.p1y[which] = self.start_p1[which, Y]
+        self.p2x[which] = self.start_p2[which, X]
+        self.p2y[which] = self.start_p2[which, Y]
+        for flags in (self.flag1_captured, self.flag2_captured, self.holder_p1, self.holder_p2):
+            flags[which] = False
+        for counter in (self.score_p1, self.score_p2, self.tick):
+            counter[which] = 0
+
+    def __len__(self):
+        return len(self.levels)
+
+    @property
+    def active(self):
+        return (self.score_p1 < WINNING_SCORE) & (self.score_p2 < WINNING_SCORE)
+
+    def _move(self, x, y, bits, active):
+        speed = np.where(active, self.speed, 0)
+        bits = np.asarray(bits)
+        nx = x + np.where(bits & RIGHT, speed, 0) - np.where(bits & LEFT, speed, 0)
+        ny = y + np.where(bits & DOWN, speed, 0) - np.where(bits & UP, speed, 0)
+
+        # Screen bounds
+        np.clip(nx, 0, SCREEN_WIDTH - PLAYER_SIZE, out=nx)
+        np.clip(ny, 0, SCREEN_HEIGHT - PLAYER_SIZE, out=ny)
+
+        # Obstacles (roll back the whole move on any hit)
+        obs = self.obstacles
+        hit = _collide(nx[:, None], ny[:, None], PLAYER_SIZE, PLAYER_SIZE,
+                       obs[:, :, X], obs[:, :, Y], obs[:, :, W], obs[:, :, H])
+        hit = (hit & self.obstacle_valid).any(axis=1)
+        return np.where(hit, x, nx).astype(np.int32), np.where(hit, y, ny).astype(np.int32)
+
+    # Advance every unfinished match by one tick. Inputs are per-match bitmasks.
+    def step(self, p1_input, p2_input):
+        active = self.active
+        self.p1x, self.p1y = self._move(self.p1x, self.p1y, p1_input, active)
+        self.p2x, self.p2y = self._move(self.p2x, self.p2y, p2_input, active)
+        size = PLAYER_SIZE
+
+        # Flags
+        f1, f2 = self.flag1, self.flag2
+        pick1 = active & ~self.holder_p1 & _collide(self.p1x, self.p1y, size, size, f2[:, X], f2[:, Y], f2[:, W], f2[:, H])
+        self.holder_p1 |= pick1
+        self.flag2_captured |= pick1
+        pick2 = active & ~self.holder_p2 & _collide(self.p2x, self.p2y, size, size, f1[:, X], f1[:, Y], f1[:, W], f1[:, H])
+        self.holder_p2 |= pick2
+        self.flag1_captured |= pick2
+
+        score1 = active & self.holder_p1 & _contains(self.base1, self.p1x, self.p1y, size)
+        self.score_p1 += score1
+        self.holder_p1 &= ~score1
+        self.flag2_captured &= ~score1
+
+        score2 = active & self.holder_p2 & _contains(self.base2, self.p2x, self.p2y, size)
+        self.score_p2 += score2
+        self.holder_p2 &= ~score2
+        self.flag1_captured &= ~score2
+
+        # Tagging
+        tag = active & _collide(self.p1x, self.p1y, size, size, self.p2x, self.p2y, size, size)
+        keep = ~tag
+        self.holder_p1 &= keep
+        self.holder_p2 &= keep
+        self.flag1_captured &= keep
+        self.flag2_captured &= keep
+
+        self.tick += active
+
+    # Match i as a scalar MatchState
+    def state(self, i):
+        state = MatchState(self.levels[i], int(self.speed[i]))
+        state.player1.topleft = int(self.p1x[i]), int(self.p1y[i])
+        state.player2.topleft = int(self.p2x[i]), int(self.p2y[i])
+        state.flag1_captured = bool(self.flag1_captured[i])
+        state.flag2_captured = bool(self.flag2_captured[i])
+        state.holder_p1 = bool(self.holder_p1[i])
+        state.holder_p2 = bool(self.holder_p2[i])
+        state.score_p1 = int(self.score_p1[i])
+        state.score_p2 = int(self.score_p2[i])
+        state.tick = int(self.tick[i])
+        return state
+
+def _state_tuple(state):
+    return (tuple(state.player1), tuple(state.player2), state.flag1_captured, state.flag2_captured,
+            state.holder_p1, state.holder_p2, state.score_p1, state.score_p2, state.tick)
+
+# Random inputs that hold each key combination for a while, so players
+# actually cross the map, pick up flags and score
+class RandomInputs:
+    def __init__(self, n, seed=0, change_prob=1 / 40):
+        self.rng = np.random.default_rng(seed)
+        self.change_prob = change_prob
+        self.p1 = self.rng.integers(0, 16, n, dtype=np.uint8)
+        self.p2 = self.rng.integers(0, 16, n, dtype=np.uint8)
+
+    def next(self):
+        n = len(self.p1)
+        for bits in (self.p1, self.p2):
+            change = self.rng.random(n) < self.change_prob
+            bits[change] = self.rng.integers(0, 16, int(change.sum()), dtype=np.uint8)
+        return self.p1, self.p2
+
+def main():
+    parser = argparse.ArgumentParser(description="Step many Flagged matches at once")
+    parser.add_argument("--matches", type=int, default=4096)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--speed", type=int, default=None, help="fixed speed (default: mix of 3/5/7)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="replay every match through sim.step and compare")
+    args = parser.parse_args()
+
+    names = sorted(LEVEL_OBSTACLES)
+    levels = [names[i % len(names)] for i in range(args.matches)]
+    speed = args.speed if args.speed is not None else np.array([(3, 5, 7)[i % 3] for i in range(args.matches)])
+    batch = MatchBatch(levels, speed)
+    inputs = RandomInputs(args.matches, args.seed)
+
+    history = []
+    start = time.perf_counter()
+    for _ in range(args.ticks):
+        p1, p2 = inputs.next()
+        if args.check:
+            history.append((p1.copy(), p2.copy()))
+        batch.step(p1, p2)
+    elapsed = time.perf_counter() - start
+
+    steps = args.matches * args.ticks
+    print(f"{args.matches} matches x {args.ticks} ticks in {elapsed:.3f}s ({steps / elapsed:,.0f} match-ticks/s)")
+    print(f"Finished matches: {int((~batch.active).sum())}, total captures: {int(batch.score_p1.sum() + batch.score_p2.sum())}")
+
+    if args.check:
+        mismatches = 0
+        for i in range(args.matches):
+            state = MatchState(levels[i], int(batch.speed[i]))
+            for p1, p2 in history:
+                step(state, int(p1[i]), int(p2[i]))
+            if _state_tuple(state) != _state_tuple(batch.state(i)):
+                mismatches += 1
+        print(f"Scalar check: {mismatches} mismatching matches")
+        if mismatches:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# Allocation check for the steady-state match loop: a simulation tick and
+# a drawn match frame should not keep anything new or churn memory. Runs a
+# match headless with scripted input, then traces a window of frames with
+# tracemalloc and fails (exit status 1) if
+#   - memory traced in the window grows by more than a little slack
+#     (something is kept per frame),
+#   - the garbage collector runs during the window, or
+#   - a frame or tick briefly allocates more than its budget (the peak of
+#     tracemalloc's traced memory within the frame, above where it started),
+#   - a frame rasterizes text instead of finding it in the text cache.
+#
+#   python -m benchmarks.allocations
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from array import array
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import game
+import sim
+from render import text_cache
+from benchmarks.fps import ScriptedKeys, SteppedTime, run_screen, scripted_bits
+from levels import LEVEL_OBSTACLES
+
+# Per-frame budget in bytes: what pygame itself hands back each frame
+# (Rects returned by draw calls, floats for interpolation) plus a margin.
+# The real key state from get_pressed() adds about 4KB a frame; it is
+# scripted here.
+FRAME_BUDGET = 2048
+TICK_BUDGET = 512
+# Growth allowed over a whole window, whatever its length: the first frames
+# traced can still leave a few one-off objects (a resized dict, a cached
+# bound method), while keeping anything per frame adds up to far more
+GROWTH_SLACK = 1024
+
+# Traced window of frames. Its own bookkeeping is allocated up front so it
+# does not show up in what it measures.
+class Window:
+    def __init__(self, frames):
+        self.peaks = array("q", bytes(8 * frames))
+        self.frames = 0
+        self.start_memory = None
+        self.end_memory = None
+        self.collections = 0
+        self.text_misses = 0
+        self.tracing = False
+        self._frame_start = 0
+
+    def on_gc(self, phase, info):
+        if phase == "start" and self.tracing:
+            self.collections += 1
+
+    def begin(self):
+        gc.collect()
+        tracemalloc.start()
+        self.tracing = True
+        self.start_memory = tracemalloc.get_traced_memory()[0]
+        self._frame_start = self.start_memory
+        tracemalloc.reset_peak()
+
+    # Close the current frame and open the next
+    def frame(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peaks[self.frames] = peak - self._frame_start
+        self.frames += 1
+        self._frame_start = current
+        tracemalloc.reset_peak()
+
+    def end(self):
+        if not self.tracing:
+            return
+        self.end_memory = tracemalloc.get_traced_memory()[0]
+        self.tracing = False
+        tracemalloc.stop()
+
+    @property
+    def growth(self):
+        return self.end_memory - self.start_memory
+
+def measure_match(level, warmup, frames, seed):
+    rng = random.Random(seed)
+    keys = ScriptedKeys()
+    window = Window(frames)
+
+    def on_frame(frame):
+        keys.bits = scripted_bits(rng, frame, keys.bits)
+        if frame == warmup:
+            text_cache.reset_stats()
+            window.begin()
+        elif frame > warmup:
+            window.frame()
+            if frame == warmup + frames:
+                window.end()  # before run_screen builds its report
+                window.text_misses = text_cache.misses
+
+    gc.callbacks.append(window.on_gc)
+    game.current_level = level
+    try:
+        run_screen(game.start_game, warmup + frames + 1, on_frame,
+                   [(pygame.key, "get_pressed", lambda: keys), (game, "time", SteppedTime()),
+                    (game, "record_replays", False)])
+    finally:
+        window.end()
+        gc.callbacks.remove(window.on_gc)
+    return window
+
+def measure_ticks(level, warmup, ticks, seed):
+    rng = random.Random(seed)
+    state = sim.MatchState(level)
+    bits = 0
+    window = Window(ticks)
+    gc.callbacks.append(window.on_gc)
+    try:
+        for tick in range(warmup + ticks):
+            if tick == warmup:
+                window.begin()
+            bits = scripted_bits(rng, tick, bits)
+            sim.step(state, bits & 15, bits >> 4)
+            if tick >= warmup:
+                window.frame()
+    finally:
+        window.end()
+        gc.callbacks.remove(window.on_gc)
+    return window
+
+def report(name, window, budget):
+    peaks = sorted(window.peaks[:window.frames])
+    print(f"{name:<16} {len(peaks):>6} {peaks[len(peaks) // 2]:>9} {peaks[-1]:>9} {window.growth:>9} "
+          f"{window.collections:>4} {window.text_misses:>5}")
+    failures = []
+    if window.growth > GROWTH_SLACK:
+        failures.append(f"{name}: traced memory grew by {window.growth} bytes")
+    if window.collections:
+        failures.append(f"{name}: {window.collections} garbage collections")
+    if window.text_misses:
+        failures.append(f"{name}: {window.text_misses} texts rendered outside the text cache")
+    if peaks[-1] > budget:
+        failures.append(f"{name}: a frame allocated {peaks[-1]} bytes (budget {budget})")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the match loop for per-frame allocations")
+    parser.add_argument("--warmup", type=int, default=300)
+    parser.add_argument("--frames", type=int, default=1200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'loop':<16} {'frames':>6} {'p50 B':>9} {'max B':>9} {'growth B':>9} {'gcs':>4} {'text':>5}")
+    failures = []
+    for level in LEVEL_OBSTACLES:
+        failures += report(f"tick:{level}", measure_ticks(level, args.warmup, args.frames * 10, args.seed),
+                           TICK_BUDGET)
+        failures += report(f"frame:{level}", measure_match(level, args.warmup, args.frames, args.seed), FRAME_BUDGET)
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("No per-frame allocations kept, no collections, every frame within budget, no text rendered")
+
+if __name__ == "__main__":
+    main()
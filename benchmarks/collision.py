@@ -0,0 +1,67 @@
+# Per-tick obstacle collision cost as the obstacle count grows.
+# Obstacle density is kept constant (the map grows with the count), so a
+# spatial index should stay flat while a linear scan grows with the count.
+#
+#   python -m benchmarks.collision
+import argparse
+import random
+import time
+
+import pygame
+
+from collision import ObstacleGrid
+
+OBSTACLE_SIZE = 20
+DENSITY = 0.1
+
+def make_map(count, rng):
+    side = int((count * OBSTACLE_SIZE * OBSTACLE_SIZE / DENSITY) ** 0.5)
+    side = max(side, 200)
+    obstacles = [pygame.Rect(rng.randrange(side), rng.randrange(side), OBSTACLE_SIZE, OBSTACLE_SIZE)
+                 for _ in range(count)]
+    return side, obstacles
+
+def linear_collides(rect, obstacles):
+    # The per-tick check start_game used to do
+    for obs in obstacles:
+        if rect.colliderect(obs):
+            return True
+    return False
+
+def time_queries(fn, queries, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for rect in queries:
+            fn(rect)
+        best = min(best, time.perf_counter() - start)
+    # Two players are checked per tick
+    return best / len(queries) * 2
+
+def main():
+    parser = argparse.ArgumentParser(description="Obstacle collision cost per tick")
+    parser.add_argument("--counts", default="5,50,500,5000,20000")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'obstacles':>10} {'linear us/tick':>15} {'grid us/tick':>13} {'build ms':>9}")
+    for count in (int(c) for c in args.counts.split(",")):
+        side, obstacles = make_map(count, rng)
+        start = time.perf_counter()
+        grid = ObstacleGrid(obstacles)
+        build = time.perf_counter() - start
+        queries = [pygame.Rect(rng.randrange(side), rng.randrange(side), 50, 50) for _ in range(args.queries)]
+
+        for rect in queries:
+            if grid.collides(rect) != linear_collides(rect, obstacles):
+                raise SystemExit(f"grid and linear scan disagree for {rect}")
+
+        linear = time_queries(lambda rect: linear_collides(rect, obstacles), queries, args.repeat)
+        indexed = time_queries(grid.collides, queries, args.repeat)
+        print(f"{count:>10} {linear * 1e6:>15.2f} {indexed * 1e6:>13.2f} {build * 1e3:>9.1f}")
+
+if __name__ == "__main__":
+    main()
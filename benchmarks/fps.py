@@ -0,0 +1,249 @@
+# Frame-time benchmark for every level and menu screen, run headless under
+# SDL's dummy video driver with scripted keyboard and mouse input.
+#
+#   python -m benchmarks.fps                   # compare with benchmarks/baseline.json
+#   python -m benchmarks.fps --save-baseline   # record a new baseline
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from array import array
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import game
+import sim
+from levels import LEVEL_OBSTACLES
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+SIM_REPEATS = 5
+KEY_BITS = {key: 1 << i for i, key in enumerate(game.P1_KEYS + game.P2_KEYS)}
+
+class FramesDone(Exception):
+    pass
+
+# Keyboard state for one frame, indexed like pygame.key.get_pressed()
+class ScriptedKeys:
+    def __init__(self):
+        self.bits = 0
+
+    def __getitem__(self, key):
+        return bool(self.bits & KEY_BITS.get(key, 0))
+
+# Holds each random key combination for a while so players cross the map
+def scripted_bits(rng, frame, current):
+    if frame % 30 == 0:
+        return rng.randrange(256)
+    return current
+
+# Stands in for the game clock: no frame cap, so frame times measure work only
+class UncappedClock:
+    def tick(self, framerate=0):
+        return 0
+
+# Advances exactly one simulation tick per frame so runs are repeatable
+class SteppedTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        self.now += 1.0 / sim.TICK_RATE
+        return self.now
+
+# Frame times are stored in an array sized up front, so recording them
+# allocates nothing while a screen runs (benchmarks.allocations relies on it)
+class FrameRecorder:
+    def __init__(self, frames, on_frame=None):
+        self.frames = frames
+        self.on_frame = on_frame
+        self.times = array("d", bytes(8 * frames))
+        self.count = 0
+        self.last = None
+
+    def present(self, *args):
+        now = time.perf_counter()
+        if self.last is not None:
+            self.times[self.count] = now - self.last
+            self.count += 1
+        self.last = now
+        if self.count >= self.frames:
+            raise FramesDone()
+        if self.on_frame:
+            self.on_frame(self.count)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+# Run one screen function until it has presented the requested frames
+def run_screen(screen_fn, frames, on_frame=None, patches=()):
+    recorder = FrameRecorder(frames, on_frame)
+    saved = [(pygame.display, "flip", pygame.display.flip),
+             (pygame.display, "update", pygame.display.update),
+             (game, "clock", game.clock)]
+    saved += [(obj, name, getattr(obj, name)) for obj, name, _ in patches]
+    pygame.display.flip = recorder.present
+    pygame.display.update = recorder.present
+    game.clock = UncappedClock()
+    for obj, name, value in patches:
+        setattr(obj, name, value)
+    try:
+        screen_fn()
+    except FramesDone:
+        pass
+    finally:
+        for obj, name, value in saved:
+            setattr(obj, name, value)
+    times = recorder.times[:recorder.count]
+    return {
+        "frames": len(times),
+        "fps": len(times) / sum(times),
+        "p50_ms": percentile(times, 50) * 1000,
+        "p95_ms": percentile(times, 95) * 1000,
+        "p99_ms": percentile(times, 99) * 1000,
+    }
+
+def bench_match(level, frames, seed):
+    rng = random.Random(seed)
+    keys = ScriptedKeys()
+
+    def on_frame(frame):
+        keys.bits = scripted_bits(rng, frame, keys.bits)
+
+    game.current_level = level
+    result = run_screen(game.start_game, frames, on_frame,
+                        [(pygame.key, "get_pressed", lambda: keys), (game, "time", SteppedTime())])
+
+    # Pure simulation throughput with the same kind of input (best of a few runs)
+    ticks = frames * 20
+    best = float("inf")
+    for _ in range(SIM_REPEATS):
+        rng = random.Random(seed)
+        state = sim.MatchState(level, game.player_speed)
+        bits = 0
+        start = time.perf_counter()
+        for tick in range(ticks):
+            bits = scripted_bits(rng, tick, bits)
+            sim.step(state, bits & 15, bits >> 4)
+        best = min(best, time.perf_counter() - start)
+    result["ticks_per_s"] = ticks / best
+    return result
+
+def bench_menu(screen_fn, frames, seed):
+    rng = random.Random(seed)
+    mouse = [(0, 0)]
+
+    # Sweep the pointer over the screen so buttons change hover state
+    def on_frame(frame):
+        if frame % 10 == 0:
+            mouse[0] = (rng.randrange(game.SCREEN_WIDTH), rng.randrange(game.SCREEN_HEIGHT))
+
+    # Busy mode, so every frame is drawn
+    return run_screen(screen_fn, frames, on_frame,
+                      [(pygame.mouse, "get_pos", lambda: mouse[0]), (game, "idle_menus", False)])
+
+# CPU time per wall-clock second on an untouched main menu with the real
+# clock, redrawing at 60 FPS versus idling on pygame.event.wait
+def measure_menu_cpu(seconds):
+    stop_event = pygame.USEREVENT + 1
+
+    def handle_event(scene, event):
+        if event.type == stop_event:
+            raise FramesDone()
+
+    usage = {}
+    saved = [(game.MainMenu, "handle_event", game.MainMenu.handle_event), (game, "idle_menus", game.idle_menus)]
+    game.MainMenu.handle_event = handle_event
+    try:
+        for idle in (False, True):
+            game.idle_menus = idle
+            pygame.event.clear()
+            pygame.time.set_timer(stop_event, int(seconds * 1000), 1)
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                game.main_menu()
+            except FramesDone:
+                pass
+            usage[idle] = (time.process_time() - cpu) / (time.perf_counter() - wall)
+    finally:
+        for obj, name, value in saved:
+            setattr(obj, name, value)
+    return usage[False], usage[True]
+
+def run_once(frames, seed):
+    results = {}
+    for level in LEVEL_OBSTACLES:
+        results[f"match:{level}"] = bench_match(level, frames, seed)
+    for name in ("main_menu", "level_select", "settings_menu"):
+        results[f"menu:{name}"] = bench_menu(getattr(game, name), frames, seed)
+    return results
+
+# Median of each metric over several runs to smooth out scheduler noise
+def run_all(frames, seed, runs=3):
+    all_runs = [run_once(frames, seed) for _ in range(runs)]
+    results = {}
+    for name, first in all_runs[0].items():
+        results[name] = {metric: sorted(run[name][metric] for run in all_runs)[runs // 2] for metric in first}
+    return results
+
+# Slower frames or fewer ticks than baseline by more than tolerance
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']:.3f} ms vs baseline {base['p95_ms']:.3f} ms")
+        if "ticks_per_s" in base and result["ticks_per_s"] < base["ticks_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['ticks_per_s']:,.0f} ticks/s vs baseline {base['ticks_per_s']:,.0f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless frame-time benchmark for Flagged")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=3, help="report the median of this many runs")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.35, help="allowed slowdown before flagging (0.35 = 35%%)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--cpu-seconds", type=float, default=2.0, help="idle menu CPU measurement per mode (0 skips it)")
+    args = parser.parse_args()
+
+    results = run_all(args.frames, args.seed, args.runs)
+
+    print(f"{'screen':<20} {'fps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sim ticks/s':>12}")
+    for name, r in results.items():
+        ticks = f"{r['ticks_per_s']:,.0f}" if "ticks_per_s" in r else "-"
+        print(f"{name:<20} {r['fps']:>9.0f} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['p99_ms']:>8.3f} {ticks:>12}")
+
+    if args.cpu_seconds > 0:
+        busy, idle = measure_menu_cpu(args.cpu_seconds)
+        reduction = (1 - idle / busy) * 100 if busy else 0.0
+        print(f"Idle main menu CPU: {busy * 100:.1f}% at 60 FPS, {idle * 100:.1f}% idle ({reduction:.0f}% less)")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
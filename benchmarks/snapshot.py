@@ -0,0 +1,89 @@
+# Cost of cloning a match for search: snapshot/restore against deepcopy,
+# packed snapshots, and short random rollouts from a restored state, all
+# without a display. Also checks that a restored match replays exactly and
+# that restoring allocates nothing.
+#
+#   python -m benchmarks.snapshot --level WATER
+import argparse
+import copy
+import random
+import time
+import tracemalloc
+
+import sim
+from levels import LEVEL_OBSTACLES
+
+# Calls per second of fn, best of a few repeats
+def rate(fn, calls, repeats=5):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return calls / best
+
+# A mid-match state: random play until someone holds a flag
+def midgame(level, speed, seed):
+    rng = random.Random(seed)
+    state = sim.MatchState(level, speed)
+    policy = sim.random_policy(rng)
+    while not (state.holder_p1 or state.holder_p2) and state.tick < 20000:
+        sim.step(state, policy(state), policy(state))
+    return state
+
+# Same inputs from a restored snapshot must give the same match
+def check_replay(state, seed, ticks=2000):
+    snap = sim.snapshot(state)
+    ends = []
+    for _ in range(2):
+        rng = random.Random(seed)
+        policy = sim.random_policy(rng)
+        sim.rollout(state, snap, policy, policy, ticks)
+        ends.append(sim.snapshot(state))
+    assert ends[0] == ends[1], "restored match diverged"
+    restore_copy = sim.MatchState(state.level, state.speed)
+    sim.restore(restore_copy, sim.unpack_snapshot(sim.pack_snapshot(snap)))
+    assert sim.snapshot(restore_copy) == snap, "packed snapshot does not round-trip"
+
+# Memory blocks allocated by n restores
+def restore_allocations(state, n=1000):
+    snap = sim.snapshot(state)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(n):
+        sim.restore(state, snap)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    return sum(stat.count_diff for stat in stats if stat.traceback[0].filename == sim.__file__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Match clone and rollout throughput")
+    parser.add_argument("--level", default="FIRE", choices=sorted(LEVEL_OBSTACLES))
+    parser.add_argument("--speed", type=int, default=3)
+    parser.add_argument("--rollout-ticks", type=int, default=60, help="ticks per rollout")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    state = midgame(args.level, args.speed, args.seed)
+    snap = sim.snapshot(state)
+    packed = sim.pack_snapshot(snap)
+    check_replay(state, args.seed)
+
+    print(f"{args.level} at tick {snap[-1]}, speed {args.speed}")
+    print(f"snapshot            {rate(lambda: sim.snapshot(state), 200000):>12,.0f} /s")
+    print(f"restore             {rate(lambda: sim.restore(state, snap), 200000):>12,.0f} /s")
+    print(f"pack + unpack       {rate(lambda: sim.unpack_snapshot(sim.pack_snapshot(snap)), 200000):>12,.0f} /s"
+          f"   ({len(packed)} bytes)")
+    print(f"deepcopy            {rate(lambda: copy.deepcopy(state), 2000):>12,.0f} /s")
+
+    rng = random.Random(args.seed)
+    policy = sim.random_policy(rng)
+    rollouts = rate(lambda: sim.rollout(state, snap, policy, policy, args.rollout_ticks), 2000)
+    print(f"rollout             {rollouts:>12,.0f} /s   ({args.rollout_ticks} random ticks each, "
+          f"{rollouts * args.rollout_ticks:,.0f} ticks/s)")
+    print(f"blocks allocated by 1000 restores: {restore_allocations(state)}")
+
+if __name__ == "__main__":
+    main()
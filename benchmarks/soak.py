@@ -0,0 +1,159 @@
+# Soak test for the scene stack: plays thousands of rounds of
+# main menu -> level select -> match (with a pause) -> game over -> ...
+# through the real main loop and fails if the scene stack, the call stack
+# or traced memory keeps growing.
+#
+#   python -m benchmarks.soak --rounds 2000
+import argparse
+import os
+import sys
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import game
+from benchmarks.fps import UncappedClock
+
+MATCH_FRAMES = 5  # frames played before the scripted win
+
+class SoakDone(Exception):
+    pass
+
+def call_depth():
+    depth = 0
+    frame = sys._getframe()
+    while frame:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+class Driver:
+    def __init__(self, rounds, warmup):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.round = 0
+        self.scene_frames = 0
+        self.last_scene = None
+        self.paused_match = None
+        self.visited_settings = False
+        self.mouse = (0, 0)
+        self.max_stack = 0
+        self.warm_depth = 0  # deepest call stack seen during warmup
+        self.max_depth = 0
+        self.warm_memory = None
+        self.end_memory = None
+
+    # Pointer moves to pos and the left button is pressed there
+    def click(self, pos):
+        self.mouse = pos
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+
+    def post_key(self, key):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0))
+
+    # Called once per presented frame; scripts input for the next frame
+    def on_frame(self, *args):
+        scene = game.manager.top
+        if scene is not self.last_scene:
+            self.last_scene = scene
+            self.scene_frames = 0
+        self.scene_frames += 1
+        self.max_stack = max(self.max_stack, len(game.manager.stack))
+        depth = call_depth()
+        if self.round < self.warmup:
+            self.warm_depth = max(self.warm_depth, depth)
+        self.max_depth = max(self.max_depth, depth)
+
+        if isinstance(scene, game.MainMenu):
+            # Every tenth round detours through the settings screen
+            if self.round % 10 == 0 and not self.visited_settings:
+                self.visited_settings = True
+                self.click((400, 365))
+            else:
+                # Alternate single-player and two-player matches
+                self.click((400, 225) if self.round % 2 else (400, 295))
+        elif isinstance(scene, game.SettingsMenu):
+            # Cycle the team size on each visit, so rounds alternate between
+            # one-on-one and team matches
+            if self.scene_frames == 1:
+                self.click((400, 235))
+            else:
+                self.click((400, 525))
+        elif isinstance(scene, game.LevelSelect):
+            if self.round % 10 == 0 and not self.visited_settings:
+                self.click((400, 525))
+            else:
+                level = self.round % len(scene.levels)
+                self.click(scene.level_rects[level].center)
+        elif isinstance(scene, game.MatchScene):
+            if self.scene_frames == 2 and self.paused_match is not scene:
+                self.paused_match = scene
+                self.post_key(pygame.K_ESCAPE)
+            elif self.scene_frames >= MATCH_FRAMES:
+                if isinstance(scene, game.TeamMatchScene):
+                    scene.match.score[0] = 3
+                else:
+                    scene.state.score_p1 = 3
+        elif isinstance(scene, game.PauseMenu):
+            self.post_key(pygame.K_ESCAPE)
+        elif isinstance(scene, game.GameOver):
+            # One click only: a second would reach the level select screen
+            if self.scene_frames == 1:
+                self.finish_round()
+                self.click((400, 325))
+
+    def finish_round(self):
+        self.round += 1
+        self.visited_settings = False
+        if self.round == self.warmup:
+            self.warm_memory = tracemalloc.get_traced_memory()[0]
+        if self.round >= self.rounds:
+            self.end_memory = tracemalloc.get_traced_memory()[0]
+            raise SoakDone()
+
+def main():
+    parser = argparse.ArgumentParser(description="Scene stack soak test")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--max-growth-kb", type=float, default=64.0)
+    args = parser.parse_args()
+
+    driver = Driver(args.rounds, args.warmup)
+    game.record_replays = False
+    game.clock = UncappedClock()
+    pygame.display.flip = driver.on_frame
+    pygame.display.update = driver.on_frame
+    pygame.mouse.get_pos = lambda: driver.mouse
+
+    tracemalloc.start()
+    try:
+        game.main_menu()
+    except SoakDone:
+        pass
+    tracemalloc.stop()
+
+    growth_kb = (driver.end_memory - driver.warm_memory) / 1024
+    print(f"Rounds played:        {driver.round}")
+    print(f"Max scene stack:      {driver.max_stack}")
+    print(f"Max call depth:       {driver.warm_depth} during warmup, {driver.max_depth} overall")
+    print(f"Memory after warmup:  {driver.warm_memory / 1024:.1f} KiB")
+    print(f"Memory at the end:    {driver.end_memory / 1024:.1f} KiB ({growth_kb:+.1f} KiB)")
+
+    failures = []
+    if driver.max_stack > 2:
+        failures.append(f"scene stack reached {driver.max_stack}")
+    if driver.max_depth > driver.warm_depth:
+        failures.append(f"call depth grew from {driver.warm_depth} to {driver.max_depth}")
+    if growth_kb > args.max_growth_kb:
+        failures.append(f"memory grew by {growth_kb:.1f} KiB")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
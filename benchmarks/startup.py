@@ -0,0 +1,71 @@
+# Cold start time of a fresh interpreter: importing the game, and getting
+# the first main menu frame on screen, with the old eager startup
+# (pygame.init(), window and fonts created at import) against the lazy one.
+#
+#   python -m benchmarks.startup --runs 10
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What importing game.py used to do before the game module itself loaded
+EAGER = ("import pygame; pygame.init(); pygame.display.set_mode((800, 600)); "
+         "pygame.font.Font(None, 36); pygame.font.Font(None, 22); ")
+# Leave as soon as the first frame is presented
+FIRST_FRAME = "pygame.display.flip = lambda *args: os._exit(0); game.main_menu()"
+
+# Every case leaves through os._exit so interpreter teardown is not timed
+CASES = (
+    ("import pygame", "import pygame; os._exit(0)"),
+    ("import game (eager)", EAGER + "import game; os._exit(0)"),
+    ("import game (lazy)", "import game; os._exit(0)"),
+    ("first frame (eager)", EAGER + "import game; " + FIRST_FRAME),
+    ("first frame (lazy)", "import pygame, game; " + FIRST_FRAME),
+    ("import sim (headless)", "import sim; os._exit(0)"),
+)
+
+def run_once(code, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import os; " + code], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+# (median, best) seconds per case. The cases take turns run by run, so a
+# slow stretch on the machine hits all of them alike.
+def time_cases(cases, runs, env):
+    times = {name: [] for name, _ in cases}
+    for _ in range(runs):
+        for name, code in cases:
+            times[name].append(run_once(code, env))
+    return {name: (sorted(t)[len(t) // 2], min(t)) for name, t in times.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start time")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    # No display to open a window on: use SDL's dummy video driver
+    if sys.platform.startswith("linux") and not (env.get("DISPLAY") or env.get("WAYLAND_DISPLAY")):
+        env.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    # Interpreter start-up alone, subtracted from every case
+    timings = time_cases((("python", "os._exit(0)"),) + CASES, args.runs, env)
+    python, _ = timings.pop("python")
+    print(f"{'case':<24} {'median ms':>10} {'best ms':>10}   (minus {python * 1000:.1f} ms interpreter start)")
+    results = {}
+    for name, (median, best) in timings.items():
+        results[name] = median - python
+        print(f"{name:<24} {(median - python) * 1000:>10.1f} {(best - python) * 1000:>10.1f}")
+
+    for what in ("import game", "first frame"):
+        eager, lazy = results[f"{what} (eager)"], results[f"{what} (lazy)"]
+        print(f"{what}: {(1 - lazy / eager) * 100:.0f}% faster")
+    # What the game's own modules add on top of pygame
+    print(f"game modules over pygame: {(results['import game (lazy)'] - results['import pygame']) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Team match cost as the number of players grows: the broad-phase tag
+# check against comparing every pair of Rects, whole simulation ticks with
+# bots, and frame times of the team match screen under SDL's dummy driver.
+#
+#   python -m benchmarks.teams --sizes 1 4 8 16 32
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import game
+from benchmarks.fps import ScriptedKeys, SteppedTime, run_screen, scripted_bits
+from sim import PLAYER_SIZE
+from teams import TeamBots, TeamMatch, _scan_pairs, _sweep_pairs, overlapping_pairs
+
+# Every pair of players compared with colliderect, as a single 1v1 tag is
+def rect_pairs(rects):
+    pairs = []
+    for i in range(len(rects)):
+        for j in range(i + 1, len(rects)):
+            if rects[i].colliderect(rects[j]):
+                pairs.append((i, j))
+    return pairs
+
+# Seconds per call of fn, best of a few repeats
+def best_time(fn, calls, repeats=5):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+# Player positions after some bot play, so players bunch up as in a match
+def played_positions(level, size, ticks, seed):
+    match = TeamMatch(level, size)
+    bots = TeamBots(match, seed, 0.02)
+    for _ in range(ticks):
+        match.step(bots())
+    return match
+
+def bench_pairs(level, size, seed):
+    match = played_positions(level, size, 600, seed)
+    x, y = match.x, match.y
+    rects = [pygame.Rect(px, py, PLAYER_SIZE, PLAYER_SIZE) for px, py in zip(x.tolist(), y.tolist())]
+    expected = rect_pairs(rects)
+    for pairs in (_scan_pairs, _sweep_pairs):
+        first, second = pairs(x, y)
+        found = sorted(tuple(sorted(pair)) for pair in zip(first.tolist(), second.tolist()))
+        assert found == expected, f"{pairs.__name__} disagrees with colliderect"
+    return best_time(lambda: overlapping_pairs(x, y), 200), best_time(lambda: rect_pairs(rects), 200)
+
+# Bots deciding from the evolving match, then the step with their inputs;
+# (ticks per second for step(), seconds per bots() call)
+def bench_ticks(level, size, ticks, seed):
+    match = TeamMatch(level, size)
+    bots = TeamBots(match, seed, 0.02)
+    stepped = decided = 0.0
+    for _ in range(ticks):
+        if match.winner is not None:
+            match = TeamMatch(level, size)
+            bots = TeamBots(match, seed, 0.02)
+        start = time.perf_counter()
+        bits = bots()
+        middle = time.perf_counter()
+        match.step(bits)
+        stepped += time.perf_counter() - middle
+        decided += middle - start
+    return ticks / stepped, decided / ticks
+
+def bench_frames(level, size, frames, seed):
+    rng = random.Random(seed)
+    keys = ScriptedKeys()
+
+    def on_frame(frame):
+        keys.bits = scripted_bits(rng, frame, keys.bits)
+
+    def play():
+        game.init_display()
+        game.run(game.TeamMatchScene())
+
+    game.current_level = level
+    game.team_size = size
+    return run_screen(play, frames, on_frame, [(pygame.key, "get_pressed", lambda: keys), (game, "time", SteppedTime())])
+
+def main():
+    parser = argparse.ArgumentParser(description="Team match cost by players per side")
+    parser.add_argument("--level", default="FIRE")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1, 4, 8, 16, 32])
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'players':>7} {'pairs us':>9} {'rects us':>9} {'ticks/s':>9} {'bots us':>8} "
+          f"{'fps':>7} {'p95 ms':>7} {'p99 ms':>7}")
+    for size in args.sizes:
+        pairs, rects = bench_pairs(args.level, size, args.seed)
+        ticks_per_s, bots = bench_ticks(args.level, size, args.ticks, args.seed)
+        frames = bench_frames(args.level, size, args.frames, args.seed)
+        print(f"{size * 2:>7} {pairs * 1e6:>9.1f} {rects * 1e6:>9.1f} {ticks_per_s:>9,.0f} {bots * 1e6:>8.1f} "
+              f"{frames['fps']:>7.0f} {frames['p95_ms']:>7.2f} {frames['p99_ms']:>7.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from levels import SCREEN_WIDTH, SCREEN_HEIGHT, LEVEL_OBSTACLES, load_level
+from sim import UP, DOWN, LEFT, RIGHT, PLAYER_SIZE, MatchState, run_headless
+
+# Navigation grid over player positions: cell (cx, cy) covers every top-left
+# position from (cx, cy) * NAV_CELL to NAV_CELL - 1 pixels further. A cell is
+# free only if the player fits at every one of those positions, so a bot in
+# a free cell can move at any speed below NAV_CELL without hitting anything.
+NAV_CELL = 10
+NAV_COLS = (SCREEN_WIDTH - PLAYER_SIZE) // NAV_CELL + 1
+NAV_ROWS = (SCREEN_HEIGHT - PLAYER_SIZE) // NAV_CELL + 1
+NAV_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".navcache")
+NAV_VERSION = 1
+UNREACHABLE = np.iinfo(np.int32).max
+
+# (dx, dy, input bits) for the eight moves a player can make
+MOVES = ((0, -1, UP), (0, 1, DOWN), (-1, 0, LEFT), (1, 0, RIGHT),
+         (-1, -1, UP | LEFT), (1, -1, UP | RIGHT), (-1, 1, DOWN | LEFT), (1, 1, DOWN | RIGHT))
+
+# A player tagged by the carrier's opponent loses the flag, so bots chase
+# carriers directly once they are this close and otherwise cut them off
+CHASE_RANGE = 150
+# Noisy bots occasionally wander off in a random direction for this long
+WANDER_TICKS = 15
+
+# b[y, x] = a[y - dy, x - dx], with fill where that falls outside the grid
+def _shift(a, dx, dy, fill):
+    out = np.full_like(a, fill)
+    rows, cols = a.shape
+    out[max(dy, 0):rows + min(dy, 0), max(dx, 0):cols + min(dx, 0)] = \
+        a[max(-dy, 0):rows + min(-dy, 0), max(-dx, 0):cols + min(-dx, 0)]
+    return out
+
+def free_cells(obstacles):
+    xs = np.arange(NAV_COLS) * NAV_CELL
+    ys = np.arange(NAV_ROWS) * NAV_CELL
+    reach = PLAYER_SIZE + NAV_CELL - 1  # covers the player anywhere in the cell
+    free = np.ones((NAV_ROWS, NAV_COLS), dtype=bool)
+    for obs in obstacles:
+        if obs.width <= 0 or obs.height <= 0:
+            continue
+        blocked_x = (xs < obs.right) & (xs + reach > obs.left)
+        blocked_y = (ys < obs.bottom) & (ys + reach > obs.top)
+        free &= ~(blocked_y[:, None] & blocked_x[None, :])
+    return free
+
+# Cells whose top-left position touches (or, with inside=True, lies within) target
+def goal_cells(target, inside=False):
+    xs = np.arange(NAV_COLS) * NAV_CELL
+    ys = np.arange(NAV_ROWS) * NAV_CELL
+    if inside:
+        in_x = (xs >= target.left) & (xs + PLAYER_SIZE <= target.right)
+        in_y = (ys >= target.top) & (ys + PLAYER_SIZE <= target.bottom)
+    else:
+        in_x = (xs < target.right) & (xs + PLAYER_SIZE > target.left)
+        in_y = (ys < target.bottom) & (ys + PLAYER_SIZE > target.top)
+    return in_y[:, None] & in_x[None, :]
+
+# Cells from which each move is allowed: the destination is free and, for
+# diagonals, so are both cells beside the corner being cut
+def _allowed_moves(free):
+    allowed = []
+    for dx, dy, _ in MOVES:
+        ok = _shift(free, -dx, -dy, False)
+        if dx and dy:
+            ok &= _shift(free, -dx, 0, False) & _shift(free, 0, -dy, False)
+        allowed.append(ok)
+    return allowed
+
+# Moves-to-goal for every cell, by breadth-first wavefront over the grid
+def distance_field(free, goal, allowed):
+    dist = np.full(free.shape, UNREACHABLE, dtype=np.int32)
+    frontier = goal & free
+    d = 0
+    while frontier.any():
+        dist[frontier] = d
+        grown = np.zeros_like(frontier)
+        # A cell joins the next wave if one of its moves lands on the frontier
+        for (dx, dy, _), ok in zip(MOVES, allowed):
+            grown |= ok & _shift(frontier, -dx, -dy, False)
+        frontier = grown & free & (dist == UNREACHABLE)
+        d += 1
+    return dist
+
+# Input bits for the best move from every cell (0 on the goal or when stuck)
+def move_field(dist, allowed):
+    best = dist.copy()
+    moves = np.zeros(dist.shape, dtype=np.uint8)
+    for (dx, dy, bits), ok in zip(MOVES, allowed):
+        there = np.where(ok, _shift(dist, -dx, -dy, UNREACHABLE), UNREACHABLE)
+        better = there < best
+        best = np.where(better, there, best)
+        moves[better] = bits
+    return moves
+
+def _targets(level):
+    state = MatchState(level)
+    return {"flag1": (state.flag1, False), "flag2": (state.flag2, False),
+            "base1": (state.base1, True), "base2": (state.base2, True)}
+
+def build_nav(level):
+    free = free_cells(LEVEL_OBSTACLES[level])
+    allowed = _allowed_moves(free)
+    arrays = {"free": free}
+    for name, (target, inside) in _targets(level).items():
+        dist = distance_field(free, goal_cells(target, inside), allowed)
+        arrays[f"{name}_dist"] = dist
+        arrays[f"{name}_moves"] = move_field(dist, allowed)
+    return arrays
+
+def nav_cache_path(level):
+    return os.path.join(NAV_CACHE_DIR, f"{level}-{load_level(level).checksum:08x}-v{NAV_VERSION}-{NAV_CELL}.npz")
+
+# Cached fields for a level, or None if the file is missing, unreadable or
+# not the arrays this version builds
+def _load_nav(path, level):
+    try:
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in _nav_names(level)}
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(array.shape != (NAV_ROWS, NAV_COLS) for array in arrays.values()):
+        return None
+    return arrays
+
+def _nav_names(level):
+    return ["free"] + [f"{name}_{field}" for name in _targets(level) for field in ("dist", "moves")]
+
+def _save_nav(path, arrays):
+    # Written under a temporary name first; tournament workers may race here
+    temp = f"{path}.{os.getpid()}.npz"
+    try:
+        os.makedirs(NAV_CACHE_DIR, exist_ok=True)
+        np.savez_compressed(temp, **arrays)
+        os.replace(temp, path)
+    except OSError:
+        pass  # read-only tree: build the fields again next time
+
+# Distance and move fields for a level to each flag and base, in the
+# navigation cache on disk (keyed by the level file's checksum) once computed
+class NavGrid:
+    def __init__(self, level):
+        path = nav_cache_path(level)
+        arrays = _load_nav(path, level)
+        if arrays is None:
+            arrays = build_nav(level)
+            _save_nav(path, arrays)
+
+        self.level = level
+        self.free = arrays["free"]
+        self.dist = {}
+        self.moves = {}
+        targets = _targets(level)
+        for name in targets:
+            self.dist[name] = arrays[f"{name}_dist"]
+            # Nested lists make the per-tick lookup a plain index
+            self.moves[name] = arrays[f"{name}_moves"].tolist()
+
+        # Final approach once on a goal cell: the player centered on the target
+        self.goals = {}
+        for name, (target, _) in targets.items():
+            self.goals[name] = (min(max(target.centerx - PLAYER_SIZE // 2, 0), SCREEN_WIDTH - PLAYER_SIZE),
+                                min(max(target.centery - PLAYER_SIZE // 2, 0), SCREEN_HEIGHT - PLAYER_SIZE))
+
+_nav_grids = {}
+
+def nav_grid(level):
+    nav = _nav_grids.get(level)
+    if nav is None:
+        nav = _nav_grids[level] = NavGrid(level)
+    return nav
+
+def _toward(me, point, speed):
+    bits = 0
+    dx = point[0] - me.x
+    dy = point[1] - me.y
+    if dx >= speed: bits |= RIGHT
+    elif dx <= -speed: bits |= LEFT
+    if dy >= speed: bits |= DOWN
+    elif dy <= -speed: bits |= UP
+    return bits
+
+# Computer player for one side. Called like a sim policy: takes the match
+# state and returns that player's input bits. Goes for the enemy flag,
+# carries it home, and chases an opponent who is carrying its own flag.
+# With an rng, each tick has a noise chance of starting a random wander,
+# which keeps two bots from mirroring each other forever.
+class Bot:
+    def __init__(self, level, player=2, rng=None, noise=0.0):
+        self.nav = nav_grid(level)
+        self.player = player
+        self.rng = rng
+        self.noise = noise
+        self.wander = 0
+        self.wander_bits = 0
+        if player == 1:
+            self.enemy_flag, self.home, self.enemy_home = "flag2", "base1", "base2"
+        else:
+            self.enemy_flag, self.home, self.enemy_home = "flag1", "base2", "base1"
+        self.last_pos = None
+        self.last_wanted = 0
+        self.slide = 0
+
+    def __call__(self, state):
+        if self.player == 1:
+            me, other, holding, carried = state.player1, state.player2, state.holder_p1, state.holder_p2
+        else:
+            me, other, holding, carried = state.player2, state.player1, state.holder_p2, state.holder_p1
+
+        if self.wander:
+            self.wander -= 1
+            return self._steer(me, self.wander_bits)
+        if self.rng and self.rng.random() < self.noise:
+            self.wander = WANDER_TICKS - 1
+            self.wander_bits = self.rng.randrange(1, 16)
+            return self._steer(me, self.wander_bits)
+
+        if holding:
+            target = self.home
+        elif carried:
+            if abs(other.x - me.x) < CHASE_RANGE and abs(other.y - me.y) < CHASE_RANGE:
+                return self._steer(me, _toward(me, other.topleft, state.speed))
+            target = self.enemy_home
+        else:
+            target = self.enemy_flag
+
+        bits = self.nav.moves[target][min(me.y // NAV_CELL, NAV_ROWS - 1)][min(me.x // NAV_CELL, NAV_COLS - 1)]
+        if not bits:
+            bits = _toward(me, self.nav.goals[target], state.speed)
+        return self._steer(me, bits)
+
+    # A move that was rolled back (an obstacle corner) is retried one axis at
+    # a time so the bot slides along the obstacle
+    def _steer(self, me, wanted):
+        pos = me.topleft
+        if wanted and wanted == self.last_wanted and pos == self.last_pos:
+            self.slide += 1
+        else:
+            self.slide = 0
+        self.last_pos = pos
+        self.last_wanted = wanted
+        if self.slide:
+            axis = (UP | DOWN) if self.slide % 2 else (LEFT | RIGHT)
+            return wanted & axis or wanted
+        return wanted
+
+def main():
+    parser = argparse.ArgumentParser(description="Play bot against bot without a window")
+    parser.add_argument("--level", default="FIRE", choices=sorted(LEVEL_OBSTACLES))
+    parser.add_argument("--speed", type=int, default=3)
+    parser.add_argument("--ticks", type=int, default=100000)
+    parser.add_argument("--noise", type=float, default=0.02, help="chance per tick of a random wander")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    nav_grid(args.level)
+    print(f"Navigation grid for {args.level} ready in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    rng = random.Random(args.seed)
+    bot1 = Bot(args.level, 1, rng, args.noise)
+    bot2 = Bot(args.level, 2, rng, args.noise)
+    state = run_headless(args.level, args.speed, bot1, bot2, args.ticks)
+    elapsed = time.perf_counter() - start
+    print(f"{state.tick} ticks in {elapsed:.3f}s ({state.tick / elapsed:,.0f} ticks/s)")
+    print(f"Score {state.score_p1} - {state.score_p2}, winner: {state.winner or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+import pygame
+
+# Frame capture for highlight reels and pixel-based agents. The game thread
+# copies each frame's 32-bit pixels from a surfarray view of the display
+# straight into a preallocated buffer; a writer thread converts them to RGB
+# and saves them to disk. When every buffer is still waiting to be written
+# the frame is dropped and counted, so gameplay never waits on the disk.
+CAPTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "captures")
+FORMATS = ("png", "raw")
+POOL_SIZE = 8  # frames that may be waiting for the writer
+
+def default_path(level):
+    return os.path.join(CAPTURE_DIR, time.strftime(f"%Y%m%d-%H%M%S-{level}"))
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+# Encoded with zlib directly, which releases the GIL while it compresses
+# (pygame.image.save would hold it and stall the game thread)
+def png_bytes(rgb):
+    height, width, _ = rgb.shape
+    rows = np.zeros((height, 1 + width * 3), dtype=np.uint8)  # filter byte 0 (None) on every row
+    rows[:, 1:] = rgb.reshape(height, width * 3)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header) +
+            _png_chunk(b"IDAT", zlib.compress(rows.data, 6)) + _png_chunk(b"IEND", b""))
+
+class FrameCapture:
+    def __init__(self, directory, fmt="png", pool_size=POOL_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown capture format {fmt!r} (expected one of {', '.join(FORMATS)})")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = fmt
+        self.pool_size = pool_size
+        self.size = None
+        self.frame = 0  # frames offered, including dropped ones
+        self.written = 0
+        self.dropped = 0
+        self._free = queue.Queue()
+        self._pending = queue.Queue()
+        self._raw = None
+        self._thread = threading.Thread(target=self._write_loop, name="frame-capture", daemon=True)
+        self._thread.start()
+
+    # Buffers hold the surface's 32-bit pixels as (height, width), allocated
+    # on the first frame; the writer picks the RGB bytes out of each pixel
+    def _allocate(self, surface):
+        self.size = width, height = surface.get_size()
+        if surface.get_bytesize() != 4:
+            raise ValueError("frame capture needs a 32-bit display surface")
+        self._channels = [shift // 8 for shift in surface.get_shifts()[:3]]
+        for _ in range(self.pool_size):
+            self._free.put(np.empty((height, width), dtype=np.uint32))
+        if self.format == "raw":
+            self._raw = open(os.path.join(self.directory, "frames.rgb"), "wb")
+
+    def capture(self, surface):
+        if self.size is None:
+            self._allocate(surface)
+        index = self.frame
+        self.frame += 1
+        try:
+            buffer = self._free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        # The view is indexed [x, y] and locks the surface until it is released
+        view = pygame.surfarray.pixels2d(surface)
+        np.copyto(buffer, view.T)
+        del view
+        self._pending.put((index, buffer))
+        return True
+
+    def _write_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            index, buffer = item
+            rgb = np.ascontiguousarray(buffer.view(np.uint8).reshape(buffer.shape + (4,))[:, :, self._channels])
+            self._free.put(buffer)
+            if self.format == "raw":
+                self._raw.write(rgb.data)
+            else:
+                with open(os.path.join(self.directory, f"frame_{index:06d}.png"), "wb") as f:
+                    f.write(png_bytes(rgb))
+            self.written += 1
+
+    # Wait for queued frames, then record what was captured next to them
+    def close(self):
+        if self._thread is None:
+            return
+        self._pending.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._raw:
+            self._raw.close()
+        width, height = self.size or (0, 0)
+        info = {"format": self.format, "width": width, "height": height,
+                "frames": self.frame, "written": self.written, "dropped": self.dropped}
+        with open(os.path.join(self.directory, "capture.json"), "w") as f:
+            json.dump(info, f, indent=2)
+
+    def summary(self):
+        return f"{self.directory}: {self.written} frames written, {self.dropped} dropped"
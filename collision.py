@@ -0,0 +1,86 @@
+CELL_SIZE = 64
+# Below this many obstacles one C-level collidelist scan beats walking cells
+SCAN_LIMIT = 64
+
+# Uniform grid over the obstacles of a level. Each cell holds the obstacles
+# overlapping it, so a movement check only tests the few obstacles near the
+# player instead of scanning the whole level.
+class ObstacleGrid:
+    def __init__(self, obstacles, cell_size=CELL_SIZE, packed=None):
+        self.obstacles = list(obstacles)
+        self.cell_size = cell_size
+        if packed is not None:
+            self._unpack(*packed)
+            return
+
+        solid = [obs for obs in self.obstacles if obs.width > 0 and obs.height > 0]
+        self.left = min([0] + [obs.left // cell_size for obs in solid])
+        self.top = min([0] + [obs.top // cell_size for obs in solid])
+        right = max([0] + [(obs.right - 1) // cell_size for obs in solid])
+        bottom = max([0] + [(obs.bottom - 1) // cell_size for obs in solid])
+        self.cols = right - self.left + 1
+        self.rows = bottom - self.top + 1
+
+        # Flat row-major list of buckets; None for empty cells
+        self.cells = [None] * (self.cols * self.rows)
+        for obs in solid:
+            for cy in range(obs.top // cell_size, (obs.bottom - 1) // cell_size + 1):
+                for cx in range(obs.left // cell_size, (obs.right - 1) // cell_size + 1):
+                    index = (cy - self.top) * self.cols + (cx - self.left)
+                    if self.cells[index] is None:
+                        self.cells[index] = []
+                    self.cells[index].append(obs)
+
+    # Bucket table as plain integers for the compiled level cache:
+    # (left, top, cols, rows), per-cell offsets and the obstacle indices
+    def pack(self):
+        index = {id(obs): i for i, obs in enumerate(self.obstacles)}
+        offsets = [0]
+        items = []
+        for bucket in self.cells:
+            items.extend(index[id(obs)] for obs in bucket or ())
+            offsets.append(len(items))
+        return (self.left, self.top, self.cols, self.rows), offsets, items
+
+    def _unpack(self, bounds, offsets, items):
+        self.left, self.top, self.cols, self.rows = bounds
+        self.cells = [[self.obstacles[i] for i in items[start:end]] if end > start else None
+                      for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def _cell_range(self, rect):
+        size = self.cell_size
+        x0 = max(rect.left // size, self.left)
+        x1 = min((rect.right - 1) // size, self.left + self.cols - 1)
+        y0 = max(rect.top // size, self.top)
+        y1 = min((rect.bottom - 1) // size, self.top + self.rows - 1)
+        return x0, x1, y0, y1
+
+    # True if rect overlaps any obstacle (same result as a colliderect scan)
+    def collides(self, rect):
+        if len(self.obstacles) <= SCAN_LIMIT:
+            return rect.collidelist(self.obstacles) != -1
+        size = self.cell_size
+        left, top, cols = self.left, self.top, self.cols
+        x0 = max(rect.left // size, left)
+        x1 = min((rect.right - 1) // size, left + cols - 1)
+        y0 = max(rect.top // size, top)
+        y1 = min((rect.bottom - 1) // size, top + self.rows - 1)
+        cells = self.cells
+        for cy in range(y0, y1 + 1):
+            row = (cy - top) * cols - left
+            for bucket in cells[row + x0:row + x1 + 1]:
+                if bucket is not None and rect.collidelist(bucket) != -1:
+                    return True
+        return False
+
+    # Obstacles in the cells overlapped by rect (may include near misses)
+    def nearby(self, rect):
+        x0, x1, y0, y1 = self._cell_range(rect)
+        found = []
+        for cy in range(y0, y1 + 1):
+            row = (cy - self.top) * self.cols - self.left
+            for cx in range(x0, x1 + 1):
+                for obs in self.cells[row + cx] or ():
+                    if obs not in found:
+                        found.append(obs)
+        return found
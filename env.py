@@ -0,0 +1,281 @@
+import argparse
+import multiprocessing as mp
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from batch import X, Y, W, H, MatchBatch
+from levels import SCREEN_WIDTH, SCREEN_HEIGHT, LEVEL_OBSTACLES
+from sim import TICK_RATE, WINNING_SCORE, PLAYER_SIZE
+
+# Each player's action is its movement bitmask (sim.UP | sim.LEFT, ...)
+NUM_ACTIONS = 16
+NEAREST_OBSTACLES = 4
+MAX_TICKS = 60 * TICK_RATE  # episodes are cut off after a minute of play
+
+# Observation layout (float32, positions scaled to 0..1):
+#   0-3   player1 x, y, player2 x, y
+#   4-7   holder_p1, holder_p2, flag1_captured, flag2_captured
+#   8-9   score_p1, score_p2 (fraction of WINNING_SCORE)
+#   10-   for player1 then player2, the NEAREST_OBSTACLES closest obstacles
+#         as (dx, dy, w, h) relative to the player, zero padded
+STATE_SIZE = 10
+OBS_SIZE = STATE_SIZE + 2 * NEAREST_OBSTACLES * 4
+
+def _nearest_obstacles(batch, px, py, k, out):
+    obs = batch.obstacles
+    ox, oy, ow, oh = obs[:, :, X], obs[:, :, Y], obs[:, :, W], obs[:, :, H]
+    px = px[:, None]
+    py = py[:, None]
+
+    # Gap between the player rect and each obstacle (0 when touching)
+    gap_x = np.maximum(np.maximum(ox - (px + PLAYER_SIZE), px - (ox + ow)), 0)
+    gap_y = np.maximum(np.maximum(oy - (py + PLAYER_SIZE), py - (oy + oh)), 0)
+    dist = (gap_x * gap_x + gap_y * gap_y).astype(np.float64)
+    dist[~batch.obstacle_valid] = np.inf
+
+    m = dist.shape[1]
+    take = min(k, m)
+    order = np.argpartition(dist, take - 1, axis=1)[:, :take] if take < m else np.arange(m)[None, :].repeat(len(dist), 0)
+    order = np.take_along_axis(order, np.argsort(np.take_along_axis(dist, order, 1), axis=1), 1)
+
+    rows = np.arange(len(dist))[:, None]
+    valid = batch.obstacle_valid[rows, order]
+    features = np.stack([(ox[rows, order] - px) / SCREEN_WIDTH, (oy[rows, order] - py) / SCREEN_HEIGHT,
+                         ow[rows, order] / SCREEN_WIDTH, oh[rows, order] / SCREEN_HEIGHT], axis=2)
+    features[~valid] = 0
+    out[:] = 0
+    out[:, :take * 4] = features.reshape(len(dist), take * 4)
+
+def observe(batch, out=None):
+    n = len(batch)
+    if out is None:
+        out = np.empty((n, OBS_SIZE), dtype=np.float32)
+    out[:, 0] = batch.p1x / SCREEN_WIDTH
+    out[:, 1] = batch.p1y / SCREEN_HEIGHT
+    out[:, 2] = batch.p2x / SCREEN_WIDTH
+    out[:, 3] = batch.p2y / SCREEN_HEIGHT
+    out[:, 4] = batch.holder_p1
+    out[:, 5] = batch.holder_p2
+    out[:, 6] = batch.flag1_captured
+    out[:, 7] = batch.flag2_captured
+    out[:, 8] = batch.score_p1 / WINNING_SCORE
+    out[:, 9] = batch.score_p2 / WINNING_SCORE
+    width = NEAREST_OBSTACLES * 4
+    _nearest_obstacles(batch, batch.p1x, batch.p1y, NEAREST_OBSTACLES, out[:, STATE_SIZE:STATE_SIZE + width])
+    _nearest_obstacles(batch, batch.p2x, batch.p2y, NEAREST_OBSTACLES, out[:, STATE_SIZE + width:])
+    return out
+
+# Many matches stepped together with a reset()/step(actions) interface.
+# Actions are an (N, 2) array of movement bitmasks for player 1 and 2.
+# Rewards are (N, 2): +1 when that player scores, -1 when the other does.
+# Finished matches (a win or MAX_TICKS) restart automatically; step()
+# returns the first observation of the new episode for them.
+class VecEnv:
+    def __init__(self, levels, speed=3, max_ticks=MAX_TICKS):
+        self.batch = MatchBatch(levels, speed)
+        self.max_ticks = max_ticks
+        self.num_envs = len(self.batch)
+        self.observation_size = OBS_SIZE
+
+    def reset(self):
+        self.batch.reset()
+        return observe(self.batch)
+
+    def step(self, actions, out=None):
+        batch = self.batch
+        actions = np.asarray(actions, dtype=np.uint8)
+        score_p1 = batch.score_p1.copy()
+        score_p2 = batch.score_p2.copy()
+        batch.step(actions[:, 0], actions[:, 1])
+
+        rewards = np.empty((self.num_envs, 2), dtype=np.float32)
+        rewards[:, 0] = (batch.score_p1 - score_p1) - (batch.score_p2 - score_p2)
+        rewards[:, 1] = -rewards[:, 0]
+
+        won = ~batch.active
+        truncated = ~won & (batch.tick >= self.max_ticks)
+        dones = won | truncated
+        info = {
+            "winner": np.where(won, np.where(batch.score_p1 >= WINNING_SCORE, 1, 2), 0).astype(np.int8),
+            "truncated": truncated,
+        }
+        if dones.any():
+            batch.reset(dones)
+        return observe(batch, out), rewards, dones, info
+
+    # Nothing to release; here so VecEnv and ShardedVecEnv are used alike
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Single-match convenience wrapper around VecEnv
+class FlaggedEnv:
+    def __init__(self, level="FIRE", speed=3, max_ticks=MAX_TICKS):
+        self.vec = VecEnv([level], speed, max_ticks)
+        self.observation_size = OBS_SIZE
+
+    def reset(self):
+        return self.vec.reset()[0]
+
+    def step(self, actions):
+        obs, rewards, dones, info = self.vec.step(np.asarray(actions, dtype=np.uint8).reshape(1, 2))
+        return obs[0], rewards[0], bool(dones[0]), {key: value[0] for key, value in info.items()}
+
+# Buffers shared between the main process and the shard workers
+_BUFFERS = (("actions", (2,), np.uint8), ("obs", (OBS_SIZE,), np.float32), ("rewards", (2,), np.float32),
+            ("dones", (), bool), ("winner", (), np.int8), ("truncated", (), bool))
+
+BUFFER_ALIGN = 8  # each buffer starts on a multiple of this, so float32 views stay aligned
+
+# (name, shape, dtype, offset) of each buffer for n envs, and the total size
+def _layout(n):
+    layout = []
+    offset = 0
+    for name, shape, dtype in _BUFFERS:
+        offset = -(-offset // BUFFER_ALIGN) * BUFFER_ALIGN
+        layout.append((name, (n,) + shape, dtype, offset))
+        offset += int(np.prod((n,) + shape)) * np.dtype(dtype).itemsize
+    return layout, offset
+
+def _attach(shm, n):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            for name, shape, dtype, offset in _layout(n)[0]}
+
+def _buffer_size(n):
+    return _layout(n)[1]
+
+def _shard_worker(conn, shm_name, n, start, stop, levels, speed, max_ticks):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = {name: array[start:stop] for name, array in _attach(shm, n).items()}
+    env = VecEnv(levels, speed, max_ticks)
+    try:
+        while True:
+            command = conn.recv()
+            if command == "step":
+                _, rewards, dones, info = env.step(arrays["actions"], arrays["obs"])
+                arrays["rewards"][:] = rewards
+                arrays["dones"][:] = dones
+                arrays["winner"][:] = info["winner"]
+                arrays["truncated"][:] = info["truncated"]
+            elif command == "reset":
+                arrays["obs"][:] = env.reset()
+            elif command == "close":
+                break
+            conn.send(True)
+    finally:
+        del arrays
+        shm.close()
+
+# Stop the shard workers and free the shared memory. Runs once, from close()
+# or when the env is garbage collected without being closed.
+def _shutdown(conns, procs, shm):
+    for conn in conns:
+        try:
+            conn.send("close")
+        except OSError:
+            pass  # worker already gone
+    for proc in procs:
+        proc.join(timeout=5)
+        if proc.is_alive():
+            proc.terminate()
+    try:
+        shm.close()
+    except BufferError:
+        pass  # arrays still viewing it; the mapping goes with them
+    shm.unlink()
+
+# VecEnv split into shards, each stepped by its own worker process. Inputs
+# and results travel through shared memory; the pipes only carry commands.
+# Use it as a context manager (or call close()) to stop the workers; the
+# shared memory is unlinked even if that is forgotten.
+class ShardedVecEnv:
+    def __init__(self, levels, speed=3, max_ticks=MAX_TICKS, workers=None):
+        levels = list(levels)
+        self.num_envs = n = len(levels)
+        self.observation_size = OBS_SIZE
+        workers = max(1, min(workers or mp.cpu_count(), n))
+
+        self._shm = shared_memory.SharedMemory(create=True, size=_buffer_size(n))
+        self._conns = []
+        self._procs = []
+        self._finalizer = weakref.finalize(self, _shutdown, self._conns, self._procs, self._shm)
+        try:
+            self._arrays = _attach(self._shm, n)
+            bounds = np.linspace(0, n, workers + 1).astype(int)
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                parent, child = mp.Pipe()
+                proc = mp.Process(target=_shard_worker, daemon=True,
+                                  args=(child, self._shm.name, n, start, stop, levels[start:stop], speed, max_ticks))
+                proc.start()
+                self._conns.append(parent)
+                self._procs.append(proc)
+        except BaseException:
+            self._arrays = None
+            self._finalizer()
+            raise
+
+    def _broadcast(self, command):
+        for conn in self._conns:
+            conn.send(command)
+        for conn in self._conns:
+            conn.recv()
+
+    def reset(self):
+        self._broadcast("reset")
+        return self._arrays["obs"].copy()
+
+    def step(self, actions):
+        self._arrays["actions"][:] = actions
+        self._broadcast("step")
+        a = self._arrays
+        info = {"winner": a["winner"].copy(), "truncated": a["truncated"].copy()}
+        return a["obs"].copy(), a["rewards"].copy(), a["dones"].copy(), info
+
+    def close(self):
+        self._arrays = None
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure environment steps per second")
+    parser.add_argument("--envs", type=int, default=8192)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=0, help="shard across this many processes (0 = no sharding)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    names = sorted(LEVEL_OBSTACLES)
+    levels = [names[i % len(names)] for i in range(args.envs)]
+    rng = np.random.default_rng(args.seed)
+    actions = rng.integers(0, NUM_ACTIONS, (args.envs, 2), dtype=np.uint8)
+
+    with ShardedVecEnv(levels, workers=args.workers) if args.workers else VecEnv(levels) as env:
+        env.reset()
+        episodes = 0
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            # Occasionally change direction so players travel
+            change = rng.random((args.envs, 2)) < 0.05
+            actions[change] = rng.integers(0, NUM_ACTIONS, int(change.sum()), dtype=np.uint8)
+            _, _, dones, _ = env.step(actions)
+            episodes += int(dones.sum())
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.envs} envs x {args.steps} steps in {elapsed:.3f}s: {args.envs * args.steps / elapsed:,.0f} steps/s "
+          f"({episodes} episodes finished)")
+
+if __name__ == "__main__":
+    main()
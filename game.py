@@ -1,16 +1,43 @@
 import pygame
 import sys
-
-pygame.init()
-
-# Screen settings
-SCREEN_WIDTH, SCREEN_HEIGHT = 800, 600
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Flagged")
-
-# Clock
-clock = pygame.time.Clock()
-font = pygame.font.Font(None, 36)
+import time
+
+import profiler
+import replay as replays
+from levelcache import level_background
+from levels import SCREEN_WIDTH, SCREEN_HEIGHT, LEVEL_COLORS, level_names
+from render import DirtyRectRenderer, gradient_surface, render_text
+from scenes import Scene, SceneManager
+from sim import UP, DOWN, LEFT, RIGHT, PLAYER_SIZE, FixedTimestep, MatchState, step
+from widgets import Button, dispatch, draw_buttons
+
+# Window, clock and fonts are created by init_display() when the first
+# screen is shown, so importing the game opens no window and only the
+# video and font subsystems are ever started (no audio or joystick).
+# Frame capture, bots and team matches are imported when first used.
+screen = None
+clock = None
+font = None
+overlay_font = None
+
+def init_display():
+    global screen, clock, font, overlay_font
+    if screen is None:
+        pygame.display.init()
+        pygame.font.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Flagged")
+        font = pygame.font.Font(None, 36)
+        overlay_font = pygame.font.Font(None, 22)
+    if clock is None:
+        clock = pygame.time.Clock()
+    return screen
+
+# Frame profilers, toggled with F3 and written to CSV on exit
+MATCH_PHASES = ("events", "input", "simulation", "background", "sprites", "score", "overlay", "capture", "present", "wait")
+MENU_PHASES = ("events", "draw", "present", "wait")
+match_profiler = profiler.add_profiler("match", MATCH_PHASES)
+menu_profiler = profiler.add_profiler("menu", MENU_PHASES)
 
 # Global dark mode flag
 dark_mode = False
@@ -18,6 +45,31 @@ dark_mode = False
 player_speed = 3
 # Global current level
 current_level = "FIRE"
+# Global level select page, kept between visits; maps/ can hold any number of levels
+level_page = 0
+LEVELS_PER_PAGE = 5
+# Global single-player mode: player 2 is a bot
+vs_bot = False
+# Players per side; above one, everyone but the human players is a bot
+team_size = 1
+# Global render mode: only push changed regions during a match (False flips the whole frame)
+dirty_rendering = True
+# Global render frame cap during a match (0 renders as fast as the display allows)
+fps_cap = 60
+FPS_CAPS = (30, 60, 120, 0)
+# Global replay recording: every match is written to replays/ when it ends
+record_replays = True
+# (Replay, MatchState) of the match being recorded, saved on quit as well
+recording = None
+# Global frame capture: matches save every frame under captures/ (F9 toggles it during a match)
+capture_frames = False
+capture_format = "png"
+# FrameCapture of the running match, and of the last one once it has stopped
+capture = None
+last_capture = None
+# Global idle mode: menus sleep until input arrives instead of redrawing at 60 FPS
+idle_menus = True
+IDLE_TIMEOUT = 250  # ms between hover checks while a menu is idle
 
 # Colors
 WHITE = (255, 255, 255)
@@ -31,87 +83,24 @@ LIGHT_MODE_COLOR = (255, 237, 220)  # Warm light color
 DARK_MODE_COLOR = (40, 0, 48)      # Deep purple dark color
 LIGHT_MODE_TEXT = (105, 2, 2)      # Deep red text for light mode
 
-# Level-specific colors
-LEVEL_COLORS = {
-    "FIRE": {
-        "gradient_top": (255, 165, 0),  # Orange
-        "gradient_bottom": (255, 0, 0),  # Red
-        "p1_color": (255, 255, 0),  # Yellow
-        "p2_color": (139, 0, 0)    # Dark Red
-    },
-    "WATER": {
-        "gradient_top": (135, 206, 235),  # Sky Blue
-        "gradient_bottom": (0, 0, 255),   # Blue
-        "p1_color": (0, 191, 255),  # Deep Sky Blue
-        "p2_color": (0, 0, 139)     # Dark Blue
-    },
-    "EARTH": {
-        "gradient_top": (144, 238, 144),  # Light Green
-        "gradient_bottom": (0, 100, 0),   # Dark Green
-        "p1_color": (34, 139, 34),   # Forest Green
-        "p2_color": (139, 69, 19)    # Brown (Saddle Brown)
-    },
-    "WIND": {
-        "gradient_top": (220, 220, 220),  # Light Gray
-        "gradient_bottom": (105, 105, 105),  # Dark Gray
-        "p1_color": (169, 169, 169),  # Dark Gray
-        "p2_color": (47, 79, 79)      # Dark Slate Gray
-    }
-}
-
-# Level-specific obstacles
-LEVEL_OBSTACLES = {
-    "FIRE": [
-        pygame.Rect(200, 100, 50, 400),  # Vertical barrier
-        pygame.Rect(550, 100, 50, 400),  # Vertical barrier
-        pygame.Rect(350, 250, 100, 100)  # Center obstacle
-    ],
-    "WATER": [
-        pygame.Rect(350, 60, 100, 100),   # Top center - moved down by 10
-        pygame.Rect(350, 440, 100, 100),  # Bottom center - moved up by 10
-        pygame.Rect(200, 250, 100, 100),  # Left middle
-        pygame.Rect(500, 250, 100, 100)   # Right middle
-    ],
-    "EARTH": [
-        pygame.Rect(150, 150, 100, 100),  # Top left
-        pygame.Rect(550, 150, 100, 100),  # Top right
-        pygame.Rect(150, 350, 100, 100),  # Bottom left
-        pygame.Rect(550, 350, 100, 100),  # Bottom right
-        pygame.Rect(350, 250, 100, 100)   # Center
-    ],
-    "WIND": [
-        pygame.Rect(250, 100, 300, 30),    # Top horizontal - thinner
-        pygame.Rect(250, 470, 300, 30),    # Bottom horizontal - thinner and lower
-        pygame.Rect(150, 200, 30, 200),    # Left vertical - thinner and more to left
-        pygame.Rect(620, 200, 30, 200),    # Right vertical - thinner and more to right
-        pygame.Rect(350, 250, 80, 80)      # Smaller center obstacle
-    ]
-}
-
 def get_colors():
     return (DARK_MODE_COLOR, WHITE) if dark_mode else (LIGHT_MODE_COLOR, LIGHT_MODE_TEXT)
 
 def draw_text_center(text, y, screen, color):
-    txt = font.render(text, True, color)
+    txt = render_text(font, text, color)
     rect = txt.get_rect(center=(SCREEN_WIDTH//2, y))
     screen.blit(txt, rect)
 
-def button(rect, text, screen, text_color, bg_color, action=None):
+# Menu button colors: (fill, label, hover fill, hover border)
+def button_colors():
+    bg_color, text_color = get_colors()
     # Ensure contrast: Use LIGHT_MODE_COLOR in light mode for visibility
     if not dark_mode:
         bg_color = LIGHT_MODE_COLOR  # Use the light mode color for buttons
-    pygame.draw.rect(screen, bg_color, rect, border_radius=5)
-    label = font.render(text, True, text_color)
-    label_rect = label.get_rect(center=rect.center)
-    screen.blit(label, label_rect)
-
-    mouse = pygame.mouse.get_pos()
-    click = pygame.mouse.get_pressed()
-    if rect.collidepoint(mouse):
-        pygame.draw.rect(screen, text_color, rect, 2, border_radius=5)
-        if click[0] and action:
-            pygame.time.delay(150)
-            action()
+    return bg_color, text_color, bg_color, text_color
+
+def button(rect, text, action=None):
+    return Button(rect, text, action, button_colors, radius=5)
 
 def toggle_dark_mode():
     global dark_mode
@@ -126,166 +115,210 @@ def toggle_player_speed():
     else:
         player_speed = 3
 
+def toggle_team_size():
+    global team_size
+    from teams import TEAM_SIZES
+    team_size = TEAM_SIZES[(TEAM_SIZES.index(team_size) + 1) % len(TEAM_SIZES)]
+
+def choose_players(bot):
+    global vs_bot
+    vs_bot = bot
+    manager.switch(LevelSelect())
+
+def toggle_fps_cap():
+    global fps_cap
+    fps_cap = FPS_CAPS[(FPS_CAPS.index(fps_cap) + 1) % len(FPS_CAPS)]
+
+def toggle_idle_menus():
+    global idle_menus
+    idle_menus = not idle_menus
+
+def toggle_dirty_rendering():
+    global dirty_rendering
+    dirty_rendering = not dirty_rendering
+
+def save_recording():
+    global recording
+    if recording:
+        replay, state = recording
+        recording = None
+        replay.finish(state)
+        replay.save(replays.default_path(replay.level))
+
+def start_capture(level):
+    global capture
+    import capture as captures
+    capture = captures.FrameCapture(captures.default_path(level), capture_format)
+
+def stop_capture():
+    global capture, last_capture
+    if capture:
+        capture.close()
+        last_capture, capture = capture, None
+
 def quit_game():
+    save_recording()
+    stop_capture()
     pygame.quit()
     sys.exit()
 
-def settings_menu():
-    while True:
+# Scene stack driven by run(); screens switch by asking the manager
+manager = SceneManager()
+
+# Menu screens share the menu profiler and run at 60 FPS; while idle
+# they only redraw after input. Each screen's buttons are kept on the class,
+# so their rendered surfaces last from one visit to the next.
+class MenuScene(Scene):
+    profiler = menu_profiler
+    fps = 60
+    idle = True
+    buttons = ()
+
+    def handle_event(self, event):
+        dispatch(self.buttons, event)
+
+    def frame(self, screen):
         bg_color, text_color = get_colors()
         screen.fill(bg_color)
+        self.draw(screen, bg_color, text_color)
+        draw_buttons(screen, self.buttons, font)
+        menu_profiler.mark("draw")
 
-        draw_text_center("Settings", 100, screen, text_color)
+    def draw(self, screen, bg_color, text_color):
+        pass
 
-        # Back button
-        button(pygame.Rect(300, 500, 200, 50), "BACK", screen, text_color, bg_color, main_menu)
+    def present(self, screen):
+        menu_profiler.draw_overlay(screen, overlay_font)
+        pygame.display.flip()
+        menu_profiler.mark("present")
+
+# Dark mode toggle (top-right), on the main menu, settings and level select
+dark_mode_button = button((SCREEN_WIDTH - 150, 10, 140, 40), lambda: "Light Mode" if dark_mode else "Dark Mode",
+                          toggle_dark_mode)
+
+class SettingsMenu(MenuScene):
+    buttons = [
+        button((300, 520, 200, 50), "BACK", lambda: manager.switch(MainMenu())),
+        dark_mode_button,
+        button((300, 150, 200, 50), lambda: f"Speed: {player_speed}", toggle_player_speed),
+        button((300, 210, 200, 50), lambda: f"Teams: {team_size}v{team_size}", toggle_team_size),
+        button((300, 270, 200, 50), lambda: "Render: Dirty" if dirty_rendering else "Render: Full",
+               toggle_dirty_rendering),
+        button((300, 330, 200, 50), lambda: f"FPS: {fps_cap}" if fps_cap else "FPS: Max", toggle_fps_cap),
+        button((300, 390, 200, 50), lambda: "Menus: Idle" if idle_menus else "Menus: 60 FPS", toggle_idle_menus),
+    ]
 
-        # Dark Mode button (top-right)
-        mode_text = "Light Mode" if dark_mode else "Dark Mode"
-        button(pygame.Rect(SCREEN_WIDTH - 150, 10, 140, 40), mode_text, screen, text_color, bg_color, toggle_dark_mode)
-        
-        # Player Speed button
-        speed_text = f"Speed: {player_speed}"
-        button(pygame.Rect(300, 200, 200, 50), speed_text, screen, text_color, bg_color, toggle_player_speed)
+    def draw(self, screen, bg_color, text_color):
+        draw_text_center("Settings", 100, screen, text_color)
 
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                quit_game()
-        clock.tick(60)
-
-def draw_gradient_background(top_color, bottom_color):
-    height = SCREEN_HEIGHT
-    for i in range(height):
-        # Calculate color for this line
-        r = int(top_color[0] + (bottom_color[0] - top_color[0]) * i / height)
-        g = int(top_color[1] + (bottom_color[1] - top_color[1]) * i / height)
-        b = int(top_color[2] + (bottom_color[2] - top_color[2]) * i / height)
-        pygame.draw.line(screen, (r, g, b), (0, i), (SCREEN_WIDTH, i))
+def turn_level_page(step):
+    global level_page
+    level_page += step
 
-def level_select():
-    global current_level
-    while True:
-        bg_color, text_color = get_colors()
-        screen.fill(bg_color)
-        draw_text_center("Select Level", 80, screen, text_color)
-
-        levels = ["FIRE", "WATER", "EARTH", "WIND"]
-        level_colors = [(255, 0, 0), (0, 0, 255), (0, 255, 0), (128, 128, 128)]
-        
-        level_rects = []
-        for i, level in enumerate(levels):
-            rect = pygame.Rect(275, 150 + i * 70, 250, 50)
-            level_rects.append(rect)
-            
-            # Draw gradient button
+# Up to LEVELS_PER_PAGE levels a page, above the BACK button; with more
+# levels the arrows beside it turn the pages
+class LevelSelect(MenuScene):
+    buttons = [
+        button((300, 500, 200, 50), "BACK", lambda: manager.switch(MainMenu())),
+        dark_mode_button,
+    ]
+    page_buttons = [
+        button((200, 500, 80, 50), "<", lambda: turn_level_page(-1)),
+        button((520, 500, 80, 50), ">", lambda: turn_level_page(1)),
+    ]
+
+    def __init__(self):
+        self.levels = level_names()
+        self.pages = max(1, -(-len(self.levels) // LEVELS_PER_PAGE))
+        if self.pages > 1:
+            self.buttons = self.buttons + self.page_buttons
+        self.show_page()
+
+    def show_page(self):
+        global level_page
+        level_page %= self.pages
+        first = level_page * LEVELS_PER_PAGE
+        self.shown = self.levels[first:first + LEVELS_PER_PAGE]
+        self.level_rects = [pygame.Rect(275, 150 + i * 70, 250, 50) for i in range(len(self.shown))]
+
+    def draw(self, screen, bg_color, text_color):
+        title = f"Select Level  {level_page + 1}/{self.pages}" if self.pages > 1 else "Select Level"
+        draw_text_center(title, 80, screen, text_color)
+
+        mouse = pygame.mouse.get_pos()
+        for level, rect in zip(self.shown, self.level_rects):
+            # Draw gradient button (pygame.draw.line includes its end point, hence the extra column)
             gradient_top = LEVEL_COLORS[level]["gradient_top"]
             gradient_bottom = LEVEL_COLORS[level]["gradient_bottom"]
-            for y in range(rect.height):
-                progress = y / rect.height
-                current_color = (
-                    int(gradient_top[0] + (gradient_bottom[0] - gradient_top[0]) * progress),
-                    int(gradient_top[1] + (gradient_bottom[1] - gradient_top[1]) * progress),
-                    int(gradient_top[2] + (gradient_bottom[2] - gradient_top[2]) * progress)
-                )
-                pygame.draw.line(screen, current_color, 
-                               (rect.left, rect.top + y), 
-                               (rect.right, rect.top + y))
+            screen.blit(gradient_surface((rect.width + 1, rect.height), gradient_top, gradient_bottom), rect.topleft)
             
             # Add level name in the button
-            level_text = font.render(level, True, WHITE)
+            level_text = render_text(font, level, WHITE)
             level_rect = level_text.get_rect(center=rect.center)
             screen.blit(level_text, level_rect)
             
             # Check for hover
-            mouse = pygame.mouse.get_pos()
             if rect.collidepoint(mouse):
                 pygame.draw.rect(screen, WHITE, rect, 2, border_radius=5)
 
-        # Back button
-        button(pygame.Rect(300, 500, 200, 50), "BACK", screen, text_color, bg_color, main_menu)
+    def handle_event(self, event):
+        global current_level
+        if dispatch(self.buttons, event):
+            self.show_page()
+            return
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            for level, rect in zip(self.shown, self.level_rects):
+                if rect.collidepoint(event.pos):
+                    current_level = level
+                    manager.switch(MatchScene() if team_size == 1 else TeamMatchScene())
+                    return
 
-        # Dark mode toggle (top-right)
-        mode_text = "Light Mode" if dark_mode else "Dark Mode"
-        button(pygame.Rect(SCREEN_WIDTH - 150, 10, 140, 40), mode_text, screen, text_color, bg_color, toggle_dark_mode)
+class PauseMenu(MenuScene):
+    buttons = [
+        button((300, 250, 200, 50), "RESUME", manager.pop),
+        button((300, 320, 200, 50), "QUIT", quit_game),
+    ]
 
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                quit_game()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = pygame.mouse.get_pos()
-                for i, rect in enumerate(level_rects):
-                    if rect.collidepoint(mouse_pos):
-                        current_level = levels[i]
-                        pygame.time.delay(150)
-                        start_game()
-                        return
-        clock.tick(60)
-
-def pause_menu():
-    while True:
-        bg_color, text_color = get_colors()
-        screen.fill(bg_color)
-        
+    def draw(self, screen, bg_color, text_color):
         draw_text_center("PAUSED", 150, screen, text_color)
-        
-        # Resume button
-        button(pygame.Rect(300, 250, 200, 50), "RESUME", screen, text_color, bg_color, lambda: None)
-        
-        # Quit button
-        button(pygame.Rect(300, 320, 200, 50), "QUIT", screen, text_color, bg_color, quit_game)
-        
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                quit_game()
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    return
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = pygame.mouse.get_pos()
-                resume_rect = pygame.Rect(300, 250, 200, 50)
-                if resume_rect.collidepoint(mouse_pos):
-                    return
-        clock.tick(60)
 
-def main_menu():
-    while True:
-        bg_color, text_color = get_colors()
-        screen.fill(bg_color)
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                manager.pop()
+        else:
+            dispatch(self.buttons, event)
+
+class MainMenu(MenuScene):
+    buttons = [
+        button((300, 200, 200, 50), "1 PLAYER", lambda: choose_players(True)),
+        button((300, 270, 200, 50), "2 PLAYERS", lambda: choose_players(False)),
+        button((300, 340, 200, 50), "SETTINGS", lambda: manager.switch(SettingsMenu())),
+        button((300, 410, 200, 50), "QUIT", quit_game),
+        dark_mode_button,
+    ]
 
+    def draw(self, screen, bg_color, text_color):
         draw_text_center("Flagged", 100, screen, text_color)
-        button(pygame.Rect(300, 200, 200, 50), "PLAY", screen, text_color, bg_color, level_select)
-        button(pygame.Rect(300, 270, 200, 50), "SETTINGS", screen, text_color, bg_color, settings_menu)
-        button(pygame.Rect(300, 340, 200, 50), "QUIT", screen, text_color, bg_color, quit_game)
 
-        # Dark mode toggle (top-right)
-        mode_text = "Light Mode" if dark_mode else "Dark Mode"
-        button(pygame.Rect(SCREEN_WIDTH - 150, 10, 140, 40), mode_text, screen, text_color, bg_color, toggle_dark_mode)
-
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                quit_game()
-        clock.tick(60)
+class GameOver(MenuScene):
+    buttons = [
+        button((300, 300, 200, 50), "PLAY AGAIN", lambda: manager.switch(LevelSelect())),
+        button((300, 370, 200, 50), "QUIT", quit_game),
+    ]
 
-def game_over(winner):
-    while True:
-        bg_color, text_color = get_colors()
-        screen.fill(bg_color)
+    def __init__(self, winner):
+        self.winner = winner
 
-        draw_text_center(f"{winner} WINS!", 200, screen, text_color)
-        button(pygame.Rect(300, 300, 200, 50), "PLAY AGAIN", screen, text_color, bg_color, level_select)
-        button(pygame.Rect(300, 370, 200, 50), "QUIT", screen, text_color, bg_color, quit_game)
+    def draw(self, screen, bg_color, text_color):
+        draw_text_center(f"{self.winner} WINS!", 200, screen, text_color)
 
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                quit_game()
-        clock.tick(60)
+# Score display last laid out: (score_p1, score_p2, text_color, p1_box,
+# p2_box, blits, region). Scores change a few times a match, so a frame
+# only redraws the boxes and blits what was rendered for the current score.
+score_panel = None
 
-def draw_score(screen, score_p1, score_p2, text_color):
+def layout_score(score_p1, score_p2, text_color):
     # Score box dimensions
     box_width = 40
     box_height = 40
@@ -297,177 +330,393 @@ def draw_score(screen, score_p1, score_p2, text_color):
     center_y = 30
     
     # Draw player labels
-    p1_label = font.render("P1", True, text_color)
-    p2_label = font.render("P2", True, text_color)
+    p1_label = render_text(font, "P1", text_color)
+    p2_label = render_text(font, "P2", text_color)
     
     # Position labels
     p1_rect = p1_label.get_rect(right=center_x - box_spacing - box_width - 10, centery=center_y)
     p2_rect = p2_label.get_rect(left=center_x + box_spacing + box_width + 10, centery=center_y)
     
-    # Draw score boxes
+    # Score boxes
     p1_box = pygame.Rect(center_x - box_spacing - box_width, center_y - box_height//2, box_width, box_height)
     p2_box = pygame.Rect(center_x + box_spacing, center_y - box_height//2, box_width, box_height)
     
-    # Draw boxes
-    pygame.draw.rect(screen, text_color, p1_box, 3, border_radius=5)
-    pygame.draw.rect(screen, text_color, p2_box, 3, border_radius=5)
-    
-    # Draw dash between scores
-    dash = font.render("-", True, text_color)
+    # Dash between scores
+    dash = render_text(font, "-", text_color)
     dash_rect = dash.get_rect(center=(center_x, center_y))
     
-    # Draw scores
-    score1 = font.render(str(score_p1), True, text_color)
-    score2 = font.render(str(score_p2), True, text_color)
+    # Scores
+    score1 = render_text(font, str(score_p1), text_color)
+    score2 = render_text(font, str(score_p2), text_color)
     
     # Position scores in center of boxes
     score1_rect = score1.get_rect(center=p1_box.center)
     score2_rect = score2.get_rect(center=p2_box.center)
-    
-    # Draw everything
-    screen.blit(p1_label, p1_rect)
-    screen.blit(p2_label, p2_rect)
-    screen.blit(dash, dash_rect)
-    screen.blit(score1, score1_rect)
-    screen.blit(score2, score2_rect)
-
-def start_game():
-    # Game variables
-    # Center the bases vertically (SCREEN_HEIGHT/2 - base_height/2)
-    base_height = 120
-    vertical_center = SCREEN_HEIGHT//2 - base_height//2  # This will be 240 (600/2 - 120/2)
-    
-    # Base positions
-    base1_x = 20
-    base2_x = 660
-    
-    player1 = pygame.Rect(base1_x + 30, SCREEN_HEIGHT//2 - 25, 50, 50)  # Center player1, offset from base
-    player2 = pygame.Rect(base2_x + 40, SCREEN_HEIGHT//2 - 25, 50, 50)  # Center player2, offset from base
-    base1 = pygame.Rect(base1_x, vertical_center, 120, base_height)  # Left base
-    base2 = pygame.Rect(base2_x, vertical_center, 120, base_height)  # Right base
-    flag1 = pygame.Rect(base1_x - 20, vertical_center + 5, 20, 50)  # Left flag, consistent offset from base
-    flag2 = pygame.Rect(base2_x + 120, vertical_center + 5, 20, 50)  # Right flag, consistent offset from base
-    
-    flag1_captured = False
-    flag2_captured = False
-    holder_p1 = False
-    holder_p2 = False
-    score_p1 = 0
-    score_p2 = 0
-    WINNING_SCORE = 3
-
-    # Get level-specific obstacles
-    obstacles = LEVEL_OBSTACLES[current_level]
-    level_colors = LEVEL_COLORS[current_level]
-
-    # Get dominant color for obstacles based on level
-    obstacle_colors = {
-        "FIRE": (255, 0, 0),      # Red
-        "WATER": (0, 0, 255),     # Blue
-        "EARTH": (0, 128, 0),     # Green
-        "WIND": (128, 128, 128)   # Gray
-    }
-    obstacle_color = obstacle_colors[current_level]
-
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                quit_game()
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    pause_menu()
 
+    blits = [(p1_label, p1_rect), (p2_label, p2_rect), (dash, dash_rect), (score1, score1_rect),
+             (score2, score2_rect)]
+    # Region covered by the score display
+    region = p1_rect.unionall([p2_rect, p1_box, p2_box])
+    return score_p1, score_p2, text_color, p1_box, p2_box, blits, region
+
+def draw_score(screen, score_p1, score_p2, text_color):
+    global score_panel
+    panel = score_panel
+    if panel is None or panel[0] != score_p1 or panel[1] != score_p2 or panel[2] != text_color:
+        panel = score_panel = layout_score(score_p1, score_p2, text_color)
+    _, _, _, p1_box, p2_box, blits, region = panel
+
+    # Draw boxes
+    pygame.draw.rect(screen, text_color, p1_box, 3, border_radius=5)
+    pygame.draw.rect(screen, text_color, p2_box, 3, border_radius=5)
+    # Draw everything
+    screen.blits(blits, doreturn=False)
+    return region
+
+# Movement key bindings in UP, DOWN, LEFT, RIGHT order
+P1_KEYS = (pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d)
+P2_KEYS = (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT)
+
+def read_input(keys, bindings):
+    up, down, left, right = bindings
+    return ((UP if keys[up] else 0) | (DOWN if keys[down] else 0) |
+            (LEFT if keys[left] else 0) | (RIGHT if keys[right] else 0))
+
+# Play a match from the keyboard, or play back a recorded replay.Replay
+# (the stack is emptied once the replay runs out)
+class MatchScene(Scene):
+    profiler = match_profiler
+    idle = False
+
+    def __init__(self, replay=None):
+        global recording
+        self.replay = replay
+        self.level = replay.level if replay else current_level
+
+        # Game variables
+        self.state = MatchState(self.level, replay.speed if replay else player_speed)
+        if replay is None and record_replays:
+            recording = (replays.Replay(self.level, player_speed), self.state)
+
+        # Player 2's keys are ignored in single-player matches
+        self.bot = None
+        if vs_bot and replay is None:
+            from bots import Bot
+            self.bot = Bot(self.level, 2)
+
+        # The simulation runs at a fixed tick rate; frames draw players
+        # interpolated between the last two ticks
+        self.setup_view(FixedTimestep())
+        self.setup_players()
+
+    # Drawing state shared by every kind of match, for self.level
+    def setup_view(self, timestep):
+        self.timestep = timestep
+        self.level_colors = LEVEL_COLORS[self.level]
+        self.renderer = DirtyRectRenderer(dirty_rendering)
+        if capture_frames:
+            start_capture(self.level)
+
+    # Last tick's positions and the rects players are drawn at between ticks
+    def setup_players(self):
+        state = self.state
+        self.prev_p1x, self.prev_p1y = state.player1.x, state.player1.y
+        self.prev_p2x, self.prev_p2y = state.player2.x, state.player2.y
+        self.draw_p1 = state.player1.copy()
+        self.draw_p2 = state.player2.copy()
+
+    @property
+    def fps(self):
+        return fps_cap
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            manager.push(PauseMenu())
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F9:
+            if capture:
+                stop_capture()
+            else:
+                start_capture(self.level)
+
+    # Back from the pause menu: redraw everything and forget the paused time
+    def resume(self):
+        self.renderer.invalidate()
+        self.timestep.reset()
+
+    # Read input and run the simulation ticks due this frame
+    def advance(self):
+        state, replay = self.state, self.replay
         keys = pygame.key.get_pressed()
-        prev_p1 = player1.copy()
-        prev_p2 = player2.copy()
-
-        # Player 1
-        if keys[pygame.K_w]: player1.y -= player_speed
-        if keys[pygame.K_s]: player1.y += player_speed
-        if keys[pygame.K_a]: player1.x -= player_speed
-        if keys[pygame.K_d]: player1.x += player_speed
-
-        # Player 2
-        if keys[pygame.K_UP]: player2.y -= player_speed
-        if keys[pygame.K_DOWN]: player2.y += player_speed
-        if keys[pygame.K_LEFT]: player2.x -= player_speed
-        if keys[pygame.K_RIGHT]: player2.x += player_speed
-
-        # Screen bounds
-        player1.clamp_ip(pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
-        player2.clamp_ip(pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
-
-        # Obstacles
-        for obs in obstacles:
-            if player1.colliderect(obs): player1 = prev_p1
-            if player2.colliderect(obs): player2 = prev_p2
-
-        # Flags
-        if player1.colliderect(flag2) and not holder_p1:
-            holder_p1 = True
-            flag2_captured = True
-        if player2.colliderect(flag1) and not holder_p2:
-            holder_p2 = True
-            flag1_captured = True
-
-        if holder_p1 and base1.contains(player1):
-            score_p1 += 1
-            holder_p1 = False
-            flag2_captured = False
-
-        if holder_p2 and base2.contains(player2):
-            score_p2 += 1
-            holder_p2 = False
-            flag1_captured = False
-
-        if player1.colliderect(player2):
-            holder_p1 = holder_p2 = False
-            flag1_captured = flag2_captured = False
-
-        # Draw gradient background
-        draw_gradient_background(level_colors["gradient_top"], level_colors["gradient_bottom"])
-
-        # Draw Bases with triple borders
-        # Black outer border
-        pygame.draw.rect(screen, BLACK, base1.inflate(4, 4), 7)
-        pygame.draw.rect(screen, BLACK, base2.inflate(4, 4), 7)
-        # Colored middle border
-        pygame.draw.rect(screen, level_colors["p1_color"], base1, 5)
-        pygame.draw.rect(screen, level_colors["p2_color"], base2, 5)
-        # Black inner border
-        pygame.draw.rect(screen, BLACK, base1.inflate(-4, -4), 3)
-        pygame.draw.rect(screen, BLACK, base2.inflate(-4, -4), 3)
+        p1_input = read_input(keys, P1_KEYS)
+        p2_input = read_input(keys, P2_KEYS)
+        match_profiler.mark("input")
+        for _ in range(self.timestep.advance(time.perf_counter())):
+            if state.winner:
+                break
+            if replay:
+                if state.tick >= len(replay):
+                    break
+                p1_input, p2_input = replay.tick_inputs(state.tick)
+            else:
+                if self.bot:
+                    p2_input = self.bot(state)
+                if recording:
+                    recording[0].record(p1_input, p2_input)
+            self.prev_p1x, self.prev_p1y = state.player1.x, state.player1.y
+            self.prev_p2x, self.prev_p2y = state.player2.x, state.player2.y
+            step(state, p1_input, p2_input)
+        match_profiler.mark("simulation")
+
+    def frame(self, screen):
+        self.advance()
+        state, renderer = self.state, self.renderer
+        level_colors = self.level_colors
+
+        alpha = self.timestep.alpha
+        player1, player2 = state.player1, state.player2
+        draw_p1, draw_p2 = self.draw_p1, self.draw_p2
+        draw_p1.x = round(self.prev_p1x + (player1.x - self.prev_p1x) * alpha)
+        draw_p1.y = round(self.prev_p1y + (player1.y - self.prev_p1y) * alpha)
+        draw_p2.x = round(self.prev_p2x + (player2.x - self.prev_p2x) * alpha)
+        draw_p2.y = round(self.prev_p2y + (player2.y - self.prev_p2y) * alpha)
+
+        self.draw_background(screen)
 
         # Draw Players
-        pygame.draw.rect(screen, level_colors["p2_color"] if holder_p1 else BLACK, player1)
-        pygame.draw.rect(screen, level_colors["p1_color"], player1, 3)
-        pygame.draw.rect(screen, level_colors["p1_color"] if holder_p2 else BLACK, player2)
-        pygame.draw.rect(screen, level_colors["p2_color"], player2, 3)
+        pygame.draw.rect(screen, level_colors["p2_color"] if state.holder_p1 else BLACK, draw_p1)
+        pygame.draw.rect(screen, level_colors["p1_color"], draw_p1, 3)
+        pygame.draw.rect(screen, level_colors["p1_color"] if state.holder_p2 else BLACK, draw_p2)
+        pygame.draw.rect(screen, level_colors["p2_color"], draw_p2, 3)
+        renderer.add(draw_p1)
+        renderer.add(draw_p2)
 
         # Draw Flags
-        if not flag1_captured:
-            pygame.draw.rect(screen, level_colors["p1_color"], flag1)
-        if not flag2_captured:
-            pygame.draw.rect(screen, level_colors["p2_color"], flag2)
-
-        # Draw Obstacles with color and black border
-        for obs in obstacles:
-            # Fill with level color
-            pygame.draw.rect(screen, obstacle_color, obs)
-            # Add black border
-            pygame.draw.rect(screen, BLACK, obs, 2)
-
-        # Draw Score
-        draw_score(screen, score_p1, score_p2, WHITE)
-
-        if score_p1 >= WINNING_SCORE:
-            game_over("Player 1")
-        elif score_p2 >= WINNING_SCORE:
-            game_over("Player 2")
+        if not state.flag1_captured:
+            pygame.draw.rect(screen, level_colors["p1_color"], state.flag1)
+            renderer.add(state.flag1)
+        if not state.flag2_captured:
+            pygame.draw.rect(screen, level_colors["p2_color"], state.flag2)
+            renderer.add(state.flag2)
+        match_profiler.mark("sprites")
+
+        self.draw_hud(screen, state.score_p1, state.score_p2)
+        self.finish()
+
+    # Draw the cached gradient, bases and obstacles
+    def draw_background(self, screen):
+        self.renderer.begin(screen, level_background(self.level))
+        match_profiler.mark("background")
+
+    # Score, profiler overlay and frame capture, once the players are drawn
+    def draw_hud(self, screen, score_p1, score_p2):
+        renderer = self.renderer
+        renderer.add(draw_score(screen, score_p1, score_p2, WHITE))
+        match_profiler.mark("score")
+        overlay = match_profiler.draw_overlay(screen, overlay_font)
+        if overlay:
+            renderer.add(overlay)
+        match_profiler.mark("overlay")
+
+        if capture:
+            capture.capture(screen)
+        match_profiler.mark("capture")
+
+    # Leave the match once it is over
+    def finish(self):
+        state, replay = self.state, self.replay
+        if replay:
+            if state.tick >= len(replay):
+                stop_capture()
+                manager.switch(None)
+        elif state.winner:
+            save_recording()
+            stop_capture()
+            manager.replace(GameOver(state.winner))
+
+    def present(self, screen):
+        self.renderer.present()
+        match_profiler.mark("present")
+
+# Match hosted by a net.Server: this window plays one side, with either
+# set of movement keys, and shows the client's predicted state
+class NetMatchScene(MatchScene):
+    def __init__(self, client):
+        self.client = client
+        self.replay = None
+        self.bot = None
+        self.level = client.state.level
+        self.state = client.state
+        self.setup_view(client.timestep)
+        self.setup_players()
+
+    def advance(self):
+        state = self.state
+        keys = pygame.key.get_pressed()
+        local_input = read_input(keys, P1_KEYS) | read_input(keys, P2_KEYS)
+        match_profiler.mark("input")
+        self.prev_p1x, self.prev_p1y = state.player1.x, state.player1.y
+        self.prev_p2x, self.prev_p2y = state.player2.x, state.player2.y
+        self.client.update(local_input)
+        match_profiler.mark("simulation")
+
+    def finish(self):
+        if self.state.winner:
+            stop_capture()
+            self.client.close()
+            manager.replace(GameOver(self.state.winner))
+
+# Team match: player 1 steers the first player of team 1 and player 2 the
+# first of team 2 (a bot in single-player matches); every other player is
+# a bot. Team matches are not recorded as replays.
+class TeamMatchScene(MatchScene):
+    def __init__(self):
+        from teams import TeamBots, TeamMatch
+        self.replay = None
+        self.level = current_level
+        self.match = TeamMatch(self.level, team_size, player_speed)
+        self.bots = TeamBots(self.match)
+        self.human_p2 = not vs_bot
+
+        self.setup_view(FixedTimestep())
+        self.prev_x = self.match.x
+        self.prev_y = self.match.y
+        self.draw_rects = [pygame.Rect(0, 0, PLAYER_SIZE, PLAYER_SIZE) for _ in range(len(self.match))]
+        self.flag_rects = [pygame.Rect(*flag) for flag in self.match.flags]
+
+    def advance(self):
+        match = self.match
+        keys = pygame.key.get_pressed()
+        p1_input = read_input(keys, P1_KEYS)
+        p2_input = read_input(keys, P2_KEYS)
+        match_profiler.mark("input")
+        for _ in range(self.timestep.advance(time.perf_counter())):
+            if match.winner is not None:
+                break
+            inputs = self.bots()
+            inputs[0] = p1_input
+            if self.human_p2:
+                inputs[match.team_size] = p2_input
+            # step() replaces the position arrays, so these stay the previous tick
+            self.prev_x, self.prev_y = match.x, match.y
+            match.step(inputs)
+        match_profiler.mark("simulation")
+
+    def frame(self, screen):
+        self.advance()
+        match, renderer = self.match, self.renderer
+        level_colors = self.level_colors
+
+        alpha = self.timestep.alpha
+        draw_x = (self.prev_x + (match.x - self.prev_x) * alpha).round().astype(int).tolist()
+        draw_y = (self.prev_y + (match.y - self.prev_y) * alpha).round().astype(int).tolist()
+
+        self.draw_background(screen)
+
+        # Fill shows the flag a player carries, outline the team
+        team_colors = (level_colors["p1_color"], level_colors["p2_color"])
+        for rect, x, y, team, holding in zip(self.draw_rects, draw_x, draw_y, match.team.tolist(),
+                                            match.holding.tolist()):
+            rect.topleft = (x, y)
+            pygame.draw.rect(screen, team_colors[1 - team] if holding else BLACK, rect)
+            pygame.draw.rect(screen, team_colors[team], rect, 3)
+            renderer.add(rect)
+        # Human players get a white marker so they can find themselves
+        humans = (0, match.team_size) if self.human_p2 else (0,)
+        for index in humans:
+            pygame.draw.rect(screen, WHITE, self.draw_rects[index].inflate(-30, -30))
+
+        for owner, rect in enumerate(self.flag_rects):
+            if not match.flag_taken[owner]:
+                pygame.draw.rect(screen, team_colors[owner], rect)
+                renderer.add(rect)
+        match_profiler.mark("sprites")
+
+        self.draw_hud(screen, int(match.score[0]), int(match.score[1]))
+        self.finish()
+
+    def finish(self):
+        if self.match.winner is not None:
+            stop_capture()
+            manager.replace(GameOver(f"Team {self.match.winner + 1}"))
+
+# Wait for input while an idle scene has nothing new to show. Returns the
+# events to handle and whether the scene needs drawing.
+def idle_events(scene, drawn_scene, drawn_mouse):
+    events = pygame.event.get()
+    redraw = (events or scene is not drawn_scene or
+              scene.profiler.enabled or pygame.mouse.get_pos() != drawn_mouse)
+    if not redraw:
+        event = pygame.event.wait(IDLE_TIMEOUT)
+        if event.type != pygame.NOEVENT:
+            events = [event] + pygame.event.get()
+        redraw = events or pygame.mouse.get_pos() != drawn_mouse
+    return events, redraw
+
+# The one main loop: runs the top scene until the stack is empty
+def run(scene=None):
+    init_display()
+    if scene is not None:
+        manager.switch(scene)
+    manager.apply()
+    drawn_scene = drawn_mouse = None
+    # Profiles are written however the loop ends: quit, closed window or error
+    try:
+        while manager.top:
+            scene = manager.top
+            scene.profiler.begin_frame()
+            if idle_menus and scene.idle:
+                events, redraw = idle_events(scene, drawn_scene, drawn_mouse)
+            else:
+                events, redraw = pygame.event.get(), True
+            for event in events:
+                if event.type == pygame.QUIT:
+                    quit_game()
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    profiler.toggle_all()
+                else:
+                    scene.handle_event(event)
+            scene.profiler.mark("events")
+
+            # Skip drawing a scene that is about to be replaced
+            if redraw and not manager.changed:
+                scene.frame(screen)
+                scene.present(screen)
+                drawn_scene, drawn_mouse = scene, pygame.mouse.get_pos()
+                clock.tick(scene.fps)
+            scene.profiler.mark("wait")
+            scene.profiler.end_frame()
+            manager.apply()
+    finally:
+        profiler.dump_all()
+
+# Entry points for each screen (the display comes first so cached
+# surfaces built by the scenes are converted to its format)
+def main_menu():
+    init_display()
+    run(MainMenu())
 
-        pygame.display.flip()
-        clock.tick(60)
+def settings_menu():
+    init_display()
+    run(SettingsMenu())
+
+def level_select():
+    init_display()
+    run(LevelSelect())
+
+# Returns the final state when playing back a replay
+def start_game(replay=None):
+    init_display()
+    scene = MatchScene(replay)
+    run(scene)
+    return scene.state
+
+# Play a networked match with a connected net.Client; returns the final state
+def start_net_game(client):
+    init_display()
+    scene = NetMatchScene(client)
+    run(scene)
+    return scene.state
 
 # Start the game
-main_menu()
\ No newline at end of file
+if __name__ == "__main__":
+    main_menu()
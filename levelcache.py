@@ -0,0 +1,169 @@
+import argparse
+import os
+import struct
+import time
+import zlib
+from array import array
+
+import pygame
+
+import levels
+from collision import CELL_SIZE, ObstacleGrid
+from levels import SCREEN_WIDTH, SCREEN_HEIGHT, level_names, load_level
+
+# Compiled forms of a level, written next to its file the first time the
+# level is used and reused until the level file's checksum or the format
+# changes. The collision grid and the rendered background are cached
+# separately (maps/fire.json -> maps/fire.grid, maps/fire.background), so
+# headless matches only ever compile and load the grid and never import
+# the renderer.
+#
+# Grid: magic, version, level file checksum, grid cell size, grid
+# left/top/cols/rows, bucket offset count, bucket item count; then the
+# offsets and items as int32
+GRID_HEADER = struct.Struct("<4sBIHiiiiII")
+GRID_MAGIC = b"FLGG"
+GRID_SUFFIX = ".grid"
+# Background: magic, version, level file checksum, width, height; then the
+# pre-rendered background as zlib-compressed RGB bytes
+BACKGROUND_HEADER = struct.Struct("<4sBIHH")
+BACKGROUND_MAGIC = b"FLGB"
+BACKGROUND_SUFFIX = ".background"
+CACHE_VERSION = 2
+
+_grids = {}
+_backgrounds = {}
+
+def cache_path(level, suffix):
+    return level.path[:-len(levels.LEVEL_SUFFIX)] + suffix
+
+def _write(path, chunks):
+    temp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp, path)
+    except OSError:
+        pass  # read-only maps/: keep the compiled level in memory only
+
+def _read(path, header):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None, None
+    if len(data) < header.size:
+        return None, None
+    return header.unpack_from(data), data
+
+def _build_grid(level):
+    return ObstacleGrid(level.obstacles)
+
+def _save_grid(level, grid):
+    (left, top, cols, rows), offsets, items = grid.pack()
+    header = GRID_HEADER.pack(GRID_MAGIC, CACHE_VERSION, level.checksum, grid.cell_size, left, top, cols, rows,
+                              len(offsets), len(items))
+    _write(cache_path(level, GRID_SUFFIX), [header, array("i", offsets).tobytes(), array("i", items).tobytes()])
+
+# Grid from the cache file, or None if it is missing or stale
+def _load_grid(level):
+    fields, data = _read(cache_path(level, GRID_SUFFIX), GRID_HEADER)
+    if fields is None:
+        return None
+    magic, version, checksum, cell_size, left, top, cols, rows, n_offsets, n_items = fields
+    if (magic, version, checksum, cell_size) != (GRID_MAGIC, CACHE_VERSION, level.checksum, CELL_SIZE):
+        return None
+    if len(data) != GRID_HEADER.size + (n_offsets + n_items) * 4:
+        return None
+    view = memoryview(data)
+    start = GRID_HEADER.size
+    offsets = view[start:start + n_offsets * 4].cast("i").tolist()
+    start += n_offsets * 4
+    items = view[start:start + n_items * 4].cast("i").tolist()
+    return ObstacleGrid(level.obstacles, CELL_SIZE, ((left, top, cols, rows), offsets, items))
+
+def _build_background(level):
+    from render import level_background as draw_level_background
+    return draw_level_background(level.name, (SCREEN_WIDTH, SCREEN_HEIGHT), level.base1, level.base2)
+
+def _save_background(level, surface):
+    header = BACKGROUND_HEADER.pack(BACKGROUND_MAGIC, CACHE_VERSION, level.checksum, SCREEN_WIDTH, SCREEN_HEIGHT)
+    _write(cache_path(level, BACKGROUND_SUFFIX), [header, zlib.compress(pygame.image.tobytes(surface, "RGB"))])
+
+# Background surface from the cache file, or None if it is missing or stale
+def _load_background(level):
+    fields, data = _read(cache_path(level, BACKGROUND_SUFFIX), BACKGROUND_HEADER)
+    if fields is None:
+        return None
+    magic, version, checksum, width, height = fields
+    if (magic, version, checksum) != (BACKGROUND_MAGIC, CACHE_VERSION, level.checksum) or \
+            (width, height) != (SCREEN_WIDTH, SCREEN_HEIGHT):
+        return None
+    try:
+        pixels = zlib.decompress(memoryview(data)[BACKGROUND_HEADER.size:])
+    except zlib.error:
+        return None
+    if len(pixels) != width * height * 3:
+        return None
+    surface = pygame.image.frombuffer(pixels, (width, height), "RGB")
+    # Match the display format once a window exists so blits stay cheap
+    return surface.convert() if pygame.display.get_surface() else surface.copy()
+
+# Collision grid for a level
+def level_grid(name):
+    grid = _grids.get(name)
+    if grid is None:
+        level = load_level(name)
+        grid = _load_grid(level)
+        if grid is None:
+            grid = _build_grid(level)
+            _save_grid(level, grid)
+        _grids[name] = grid
+    return grid
+
+# Static layer of a level (gradient, bases and obstacles) at screen size
+def level_background(name):
+    surface = _backgrounds.get(name)
+    if surface is None:
+        level = load_level(name)
+        surface = _load_background(level)
+        if surface is None:
+            surface = _build_background(level)
+            _save_background(level, surface)
+        _backgrounds[name] = surface
+    return surface
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile level caches and time loading them")
+    parser.add_argument("--rebuild", action="store_true", help="delete existing caches first")
+    args = parser.parse_args()
+
+    from render import clear_caches
+    for name in level_names():
+        level = load_level(name)
+        paths = [cache_path(level, suffix) for suffix in (GRID_SUFFIX, BACKGROUND_SUFFIX)]
+        for path in paths:
+            if args.rebuild and os.path.exists(path):
+                os.remove(path)
+        level_grid(name)
+        level_background(name)
+
+        timings = []
+        for build, load in ((_build_grid, _load_grid), (_build_background, _load_background)):
+            clear_caches()
+            start = time.perf_counter()
+            build(level)
+            built = time.perf_counter() - start
+            start = time.perf_counter()
+            load(level)
+            timings.append((built, time.perf_counter() - start))
+        sizes = ", ".join(f"{os.path.basename(path)} {os.path.getsize(path) / 1024:.1f} KiB"
+                          for path in paths if os.path.exists(path))
+        (grid_built, grid_loaded), (background_built, background_loaded) = timings
+        print(f"{name:<8} grid: build {grid_built * 1000:.2f} ms, load {grid_loaded * 1000:.2f} ms | "
+              f"background: build {background_built * 1000:.2f} ms, load {background_loaded * 1000:.2f} ms | "
+              f"{sizes}")
+
+if __name__ == "__main__":
+    main()
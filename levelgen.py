@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+import pygame
+
+from bots import NAV_CELL, NAV_COLS, NAV_ROWS, free_cells, goal_cells
+from levels import SCREEN_WIDTH, SCREEN_HEIGHT, Level, add_level, level_names, load_level
+from sim import PLAYER_SIZE
+
+# Seeded level generator. A level is a set of obstacles mirrored across the
+# middle of the screen, around the usual bases, flags and spawns, and is only
+# kept if both players can reach the enemy flag and get back inside their
+# own base. Generated levels are saved in the maps/ JSON format under
+# GENERATED_DIR, one file per seed, and load by name ("GEN<seed>") like any
+# other level once generated_level() has been called.
+#
+#   python levelgen.py --count 5000        # generation rate and rejections
+GENERATED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".levelgen")
+GENERATOR_VERSION = 2  # part of the file name; bump when the output for a seed changes
+NAME_PREFIX = "GEN"
+
+# Layout shared by every generated level (as in the hand-made ones)
+BASES = [[20, 240, 120, 120], [660, 240, 120, 120]]
+FLAGS = [[0, 245, 20, 50], [780, 245, 20, 50]]
+SPAWNS = [[50, 275], [700, 275]]
+KEEP_CLEAR = 30  # obstacles stay this far from bases, flags and spawns
+
+MIN_PAIRS, MAX_PAIRS = 2, 7  # obstacles per side
+MIN_SIZE, MAX_SIZE = 20, 240
+GRID = 10  # obstacle positions and sizes are multiples of this
+MAX_ATTEMPTS = 1000
+
+class GenerationError(Exception):
+    pass
+
+def _rect(values):
+    x, y, w, h = values
+    return x, y, x + w, y + h
+
+_keep_clear = [(left - KEEP_CLEAR, top - KEEP_CLEAR, right + KEEP_CLEAR, bottom + KEEP_CLEAR)
+               for left, top, right, bottom in [_rect(r) for r in BASES + FLAGS] +
+               [_rect(s + [PLAYER_SIZE, PLAYER_SIZE]) for s in SPAWNS]]
+
+def _blocks_layout(left, top, right, bottom):
+    for l, t, r, b in _keep_clear:
+        if left < r and top < b and right > l and bottom > t:
+            return True
+    return False
+
+# Candidate obstacles: random rects on the left half and their mirror images
+def _obstacles(rng):
+    obstacles = []
+    for _ in range(rng.randint(MIN_PAIRS, MAX_PAIRS)):
+        for _ in range(20):
+            w = rng.randrange(MIN_SIZE, MAX_SIZE + 1, GRID)
+            h = rng.randrange(MIN_SIZE, MAX_SIZE + 1, GRID)
+            x = rng.randrange(0, SCREEN_WIDTH // 2 - w + 1, GRID)
+            y = rng.randrange(0, SCREEN_HEIGHT - h + 1, GRID)
+            if not _blocks_layout(x, y, x + w, y + h):
+                # Every obstacle lies within the left half; one touching the
+                # middle gets a mirror image abutting it
+                obstacles.append([x, y, w, h])
+                obstacles.append([SCREEN_WIDTH - x - w, y, w, h])
+                break
+    return obstacles
+
+# Run ids along each row and each column of the free cells: free cells in
+# the same run share an id and can reach each other in a straight line
+def _runs(free):
+    starts = free.copy()
+    starts[:, 1:] &= ~free[:, :-1]
+    by_row = np.cumsum(starts.ravel()).reshape(free.shape)
+    starts = free.copy()
+    starts[1:, :] &= ~free[:-1, :]
+    by_column = np.cumsum(starts.ravel(order="F")).reshape(free.shape, order="F")
+    return by_row, by_column
+
+# Free cells reachable from start. Rather than growing one cell per pass,
+# each pass spreads along whole row runs and then whole column runs, so the
+# number of passes follows the turns in a path, not its length.
+def flood_fill(free, start):
+    by_row, by_column = _runs(free)
+    reached = start & free
+    count = int(reached.sum())
+    while count:
+        for runs in (by_row, by_column):
+            hit = np.zeros(runs[-1, -1] + 1, dtype=bool)  # the last cell has the highest id either way
+            hit[runs[reached]] = True
+            reached = free & hit[runs]
+        new_count = int(reached.sum())
+        if new_count == count:
+            break
+        count = new_count
+    return reached
+
+def _cell(point):
+    return min(point[1] // NAV_CELL, NAV_ROWS - 1), min(point[0] // NAV_CELL, NAV_COLS - 1)
+
+SPAWN_CELLS = [_cell(spawn) for spawn in SPAWNS]
+FLAG_GOALS = [goal_cells(pygame.Rect(flag)) for flag in FLAGS]
+BASE_GOALS = [goal_cells(pygame.Rect(base), inside=True) for base in BASES]
+
+# Each player can get from their spawn to the enemy flag and back inside
+# their own base, moving between free navigation cells
+def playable(obstacles):
+    free = free_cells([pygame.Rect(obs) for obs in obstacles])
+    reached = None
+    for player, enemy in ((0, 1), (1, 0)):
+        cell = SPAWN_CELLS[player]
+        if not free[cell]:
+            return False
+        if reached is None or not reached[cell]:
+            start = np.zeros_like(free)
+            start[cell] = True
+            reached = flood_fill(free, start)
+        if not ((reached & FLAG_GOALS[enemy]).any() and (reached & BASE_GOALS[player]).any()):
+            return False
+    return True
+
+# (level file contents in the maps/ format, layouts tried) for seed
+def _generate(seed):
+    rng = random.Random(f"levelgen:{seed}")
+    palette = load_level(rng.choice(level_names()))
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        obstacles = _obstacles(rng)
+        if playable(obstacles):
+            break
+    else:
+        raise GenerationError(f"no playable layout for seed {seed} in {MAX_ATTEMPTS} attempts")
+    colors = {key: list(color) for key, color in palette.colors.items()}
+    colors["obstacle"] = list(palette.obstacle_color)
+    layout = {"order": 0, "colors": colors, "obstacles": obstacles, "bases": BASES, "flags": FLAGS, "spawns": SPAWNS}
+    return layout, attempt
+
+def generate(seed):
+    return _generate(seed)[0]
+
+def level_name(seed):
+    return f"{NAME_PREFIX}{seed}"
+
+def generated_path(seed):
+    return os.path.join(GENERATED_DIR, f"v{GENERATOR_VERSION}-{seed}.json")
+
+# Generate the level for seed unless it is already on disk, and make it
+# loadable by name. Returns the name.
+def generated_level(seed):
+    path = generated_path(seed)
+    if not os.path.exists(path):
+        source = json.dumps(generate(seed)).encode()
+        os.makedirs(GENERATED_DIR, exist_ok=True)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(source)
+        os.replace(temp, path)
+    name = level_name(seed)
+    add_level(name, path)
+    return name
+
+# Make a generated level's name loadable (in a worker process, say)
+def register(name):
+    if name.startswith(NAME_PREFIX) and name[len(NAME_PREFIX):].isdigit():
+        generated_level(int(name[len(NAME_PREFIX):]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate levels and measure the generation rate")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--check", action="store_true",
+                        help="also compare the flood fill with the bots' distance fields")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.count)
+    start = time.perf_counter()
+    results = [_generate(seed) for seed in seeds]
+    attempts = sum(attempt for _, attempt in results)
+    elapsed = time.perf_counter() - start
+    print(f"{args.count} levels in {elapsed:.2f}s ({args.count / elapsed:,.0f} levels/s), "
+          f"{attempts} layouts checked ({attempts / elapsed:,.0f}/s, {1 - args.count / attempts:.0%} rejected)")
+
+    start = time.perf_counter()
+    for seed in seeds:
+        generated_level(seed)
+    print(f"Saved or loaded {args.count} levels under {GENERATED_DIR} in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    for seed in seeds:
+        generated_level(seed)
+    print(f"From the cache: {args.count / (time.perf_counter() - start):,.0f} levels/s")
+
+    if args.check:
+        import bots
+        for seed, (layout, _) in zip(seeds, results):
+            obstacles = sorted(map(tuple, layout["obstacles"]))
+            if obstacles != sorted((SCREEN_WIDTH - x - w, y, w, h) for x, y, w, h in obstacles):
+                raise SystemExit(f"seed {seed}: obstacles are not mirrored across the middle")
+            level = Level(level_name(seed), generated_path(seed), json.dumps(layout).encode())
+            free = free_cells(level.obstacles)
+            start = np.zeros_like(free)
+            start[_cell(SPAWNS[0])] = True
+            dist = bots.distance_field(free, start, bots._allowed_moves(free))
+            # 4-way fill is a subset of what the bots' 8-way moves reach
+            if (flood_fill(free, start) & (dist == bots.UNREACHABLE)).any():
+                raise SystemExit(f"seed {seed}: flood fill reaches cells the distance field does not")
+        print(f"All {args.count} levels are symmetric and the flood fill agrees with the distance fields")
+
+if __name__ == "__main__":
+    main()
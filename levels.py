@@ -0,0 +1,132 @@
+import json
+import os
+import zlib
+from collections.abc import Mapping
+
+import pygame
+
+# Screen settings
+SCREEN_WIDTH, SCREEN_HEIGHT = 800, 600
+
+# Levels are JSON files in maps/, named after the level (maps/fire.json is
+# FIRE). Each file holds the level's colors, obstacles and the placement of
+# both bases, flags and player spawns:
+#
+#   {"order": 1,
+#    "colors": {"gradient_top": [r, g, b], "gradient_bottom": [r, g, b],
+#               "p1_color": [r, g, b], "p2_color": [r, g, b], "obstacle": [r, g, b]},
+#    "obstacles": [[x, y, w, h], ...],
+#    "bases": [[x, y, w, h], [x, y, w, h]],
+#    "flags": [[x, y, w, h], [x, y, w, h]],
+#    "spawns": [[x, y], [x, y]]}
+#
+# "order" (an integer, 0 if left out) places the level in the level select
+# menu. A file is only read the first time its level is used.
+MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps")
+LEVEL_SUFFIX = ".json"
+COLOR_KEYS = ("gradient_top", "gradient_bottom", "p1_color", "p2_color")
+
+class LevelError(Exception):
+    pass
+
+def _numbers(value, count, what):
+    if not isinstance(value, list) or len(value) != count or not all(isinstance(v, int) for v in value):
+        raise LevelError(f"{what} must be a list of {count} integers, got {value!r}")
+    return value
+
+def _color(value, what):
+    color = tuple(_numbers(value, 3, what))
+    if not all(0 <= v <= 255 for v in color):
+        raise LevelError(f"{what} must have components from 0 to 255, got {value!r}")
+    return color
+
+def _order(value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise LevelError(f"order must be an integer, got {value!r}")
+    return value
+
+def _pair(value, what):
+    if not isinstance(value, list) or len(value) != 2:
+        raise LevelError(f"{what} must list one entry per player")
+    return value
+
+class Level:
+    def __init__(self, name, path, source):
+        self.name = name
+        self.path = path
+        self.checksum = zlib.crc32(source)  # of the file, so edits invalidate compiled caches
+        try:
+            data = json.loads(source)
+            colors = data["colors"]
+            self.order = _order(data.get("order", 0))
+            self.colors = {key: _color(colors[key], f"colors.{key}") for key in COLOR_KEYS}
+            self.obstacle_color = _color(colors["obstacle"], "colors.obstacle")
+            self.obstacles = [pygame.Rect(_numbers(obs, 4, "obstacle")) for obs in data["obstacles"]]
+            self.base1, self.base2 = (pygame.Rect(_numbers(r, 4, "base")) for r in _pair(data["bases"], "bases"))
+            self.flag1, self.flag2 = (pygame.Rect(_numbers(r, 4, "flag")) for r in _pair(data["flags"], "flags"))
+            self.spawn1, self.spawn2 = (tuple(_numbers(p, 2, "spawn")) for p in _pair(data["spawns"], "spawns"))
+        except LevelError as exc:
+            raise LevelError(f"{path}: {exc}") from None
+        except KeyError as exc:
+            raise LevelError(f"{path}: missing {exc}") from None
+        except (ValueError, TypeError, AttributeError) as exc:
+            raise LevelError(f"{path}: {exc}") from None
+
+_files = None
+_names = None
+_levels = {}
+_added = {}  # name -> path of levels added at run time; not in the menu
+
+# Level name -> file path for every file in maps/ (read once)
+def level_files():
+    global _files
+    if _files is None:
+        _files = {entry[:-len(LEVEL_SUFFIX)].upper(): os.path.join(MAPS_DIR, entry)
+                  for entry in sorted(os.listdir(MAPS_DIR)) if entry.endswith(LEVEL_SUFFIX)}
+    return _files
+
+# Make a level file outside maps/ (e.g. a generated one) loadable by name
+def add_level(name, path):
+    _added[name] = path
+
+def load_level(name):
+    level = _levels.get(name)
+    if level is None:
+        path = _added[name] if name in _added else level_files()[name]
+        with open(path, "rb") as f:
+            source = f.read()
+        level = _levels[name] = Level(name, path, source)
+    return level
+
+# Level names in menu order
+def level_names():
+    global _names
+    if _names is None:
+        _names = sorted(level_files(), key=lambda name: (load_level(name).order, name))
+    return _names
+
+# Read-only view of one field of every level, loaded on first access
+class _LevelTable(Mapping):
+    def __init__(self, field):
+        self.field = field
+
+    def __getitem__(self, name):
+        return getattr(load_level(name), self.field)
+
+    def __contains__(self, name):
+        return name in level_files() or name in _added
+
+    # Menu levels in menu order, then levels added at run time
+    def __iter__(self):
+        yield from level_names()
+        yield from (name for name in _added if name not in level_files())
+
+    def __len__(self):
+        return len(level_files()) + sum(name not in level_files() for name in _added)
+
+# Level-specific colors
+LEVEL_COLORS = _LevelTable("colors")
+# Level-specific obstacles
+LEVEL_OBSTACLES = _LevelTable("obstacles")
+# Dominant obstacle color for each level
+OBSTACLE_COLORS = _LevelTable("obstacle_color")
@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import random
+import time
+from collections import deque
+
+from levels import LEVEL_OBSTACLES
+from net import (DEFAULT_PORT, HELLO, INPUT, INPUT_BODY, LINGER, PACKET, PROTOCOL, SNAPSHOT, SNAPSHOT_BODY, VERSION,
+                 WELCOME, HostedMatch, packet)
+from sim import TICK_RATE
+
+# Many matches in one process on one UDP port, for online events. Players
+# connect with the same protocol as net.Server (net.Client works as is) and
+# are paired into matches in the order they arrive; levels rotate from one
+# match to the next. A single scheduler ticks every running match at
+# TICK_RATE, then sends all of that tick's snapshots together.
+#
+#   python matchhost.py serve --levels FIRE WATER
+#   python matchhost.py load --matches 200      # host plus 400 local bot clients
+MAX_CATCHUP = 4  # ticks run back to back after a stall before skipping ahead
+REPORT_WINDOW = 600  # ticks kept for the timing percentiles
+SEAT_TIMEOUT = 5.0  # seconds without a datagram before a player is dropped
+EXPIRY_INTERVAL = 1.0  # seconds between checks for silent players
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+# Scheduler health. A tick overruns when its work ends after the next tick
+# was due; lateness is how long after its due time a tick started.
+class TickStats:
+    def __init__(self):
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.packets = 0
+        self.work = deque(maxlen=REPORT_WINDOW)
+        self.late = deque(maxlen=REPORT_WINDOW)
+        self.window_start = time.perf_counter()
+        self.window_ticks = 0
+        self.window_packets = 0
+
+    def add(self, late, work, packets, budget):
+        self.ticks += 1
+        self.packets += packets
+        self.window_ticks += 1
+        self.window_packets += packets
+        self.late.append(late)
+        self.work.append(work)
+        if late + work > budget:
+            self.overruns += 1
+
+    # One line for the last report window
+    def report(self, matches, players):
+        now = time.perf_counter()
+        elapsed = max(now - self.window_start, 1e-9)
+        line = (f"{matches:>4} matches {players:>5} players | {self.window_ticks / elapsed:5.1f} ticks/s, "
+                f"work p50 {_percentile(self.work, 50) * 1000:5.2f} ms p99 {_percentile(self.work, 99) * 1000:5.2f} ms, "
+                f"late p99 {_percentile(self.late, 99) * 1000:5.2f} ms | {self.overruns} overruns, "
+                f"{self.skipped} skipped | {self.window_packets / elapsed:,.0f} packets/s out")
+        self.window_start = now
+        self.window_ticks = self.window_packets = 0
+        return line
+
+class MatchHost(asyncio.DatagramProtocol):
+    def __init__(self, levels=("FIRE",), speed=3):
+        self.levels = itertools.cycle(levels)
+        self.speed = speed
+        self.matches = []  # running matches
+        self.waiting = None  # match with one player so far
+        self.seats = {}  # address -> (match, seat)
+        self.last_seen = {}  # address -> when its last datagram arrived
+        self.next_expiry = 0.0
+        self.finished = {}  # match -> when it ended
+        self.transport = None
+        self.stats = TickStats()
+        self.received = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        if len(data) < PACKET.size:
+            return
+        protocol, version, kind = PACKET.unpack_from(data)
+        if protocol != PROTOCOL or version != VERSION:
+            return
+        self.received += 1
+        entry = self.seats.get(address)
+        if entry is not None or kind == HELLO:
+            self.last_seen[address] = time.perf_counter()
+        if kind == INPUT:
+            if entry is not None:
+                match, seat = entry
+                match.receive_input(seat, data[PACKET.size:])
+        elif kind == HELLO:
+            if entry is None:
+                if self.waiting is None:
+                    self.waiting = HostedMatch(next(self.levels), self.speed)
+                match = self.waiting
+                entry = self.seats[address] = (match, match.join(address))
+                if match.full:
+                    self.matches.append(match)
+                    self.waiting = None
+            match, seat = entry
+            self.transport.sendto(match.welcome(seat), address)
+
+    # Step every running match once, then send the whole tick's snapshots
+    def tick(self, now):
+        out = []
+        for match in self.matches:
+            match.tick(out)
+            if match.state.winner and match not in self.finished:
+                self.finished[match] = now
+        sendto = self.transport.sendto
+        for data, address in out:
+            sendto(data, address)
+
+        # Finished matches keep sending for a while so the last state arrives
+        for match, ended in list(self.finished.items()):
+            if now - ended > LINGER:
+                del self.finished[match]
+                self.matches.remove(match)
+                for seat in match.seats:
+                    del self.seats[seat.address]
+                    self.last_seen.pop(seat.address, None)
+        if now >= self.next_expiry:
+            self.next_expiry = now + EXPIRY_INTERVAL
+            self.expire(now)
+        return len(out)
+
+    # Players silent for SEAT_TIMEOUT leave: a running match is forfeited
+    # to the other player (and ends as usual), and a player still waiting
+    # for an opponent frees the slot for the next one to join
+    def expire(self, now):
+        for address, seen in list(self.last_seen.items()):
+            if now - seen <= SEAT_TIMEOUT:
+                continue
+            match, seat = self.seats[address]
+            if match is self.waiting:
+                self.waiting = None
+                del self.seats[address]
+                del self.last_seen[address]
+            elif not match.state.winner:
+                match.forfeit(seat)
+
+    async def run(self, duration=None, report_every=5.0, report=print):
+        tick_time = 1.0 / TICK_RATE
+        start = next_tick = time.perf_counter()
+        next_report = start + report_every
+        while duration is None or next_tick - start < duration:
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            began = time.perf_counter()
+            packets = self.tick(began)
+            done = time.perf_counter()
+            self.stats.add(began - next_tick, done - began, packets, tick_time)
+
+            next_tick += tick_time
+            # After a stall, run at most a few ticks back to back and skip the rest
+            behind = int((done - next_tick) / tick_time) - MAX_CATCHUP
+            if behind > 0:
+                self.stats.skipped += behind
+                next_tick += behind * tick_time
+            if report and done >= next_report:
+                report(self.stats.report(len(self.matches), len(self.seats)))
+                next_report += report_every
+
+async def _serve(levels, speed, host, port, duration, report_every, ready=None):
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: MatchHost(levels, speed), local_addr=(host, port))
+    if ready is not None:
+        ready(transport.get_extra_info("sockname"))
+    try:
+        await server.run(duration, report_every)
+    finally:
+        transport.close()
+    return server
+
+# Load-test client: joins, then sends a held random input every tick and
+# acknowledges snapshots, without simulating anything itself
+class LoadClient(asyncio.DatagramProtocol):
+    def __init__(self, rng):
+        self.rng = rng
+        self.transport = None
+        self.player = None
+        self.latest = 0
+        self.seq = 0
+        self.bits = 0
+        self.recent = deque(maxlen=8)
+        self.snapshots = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        if len(data) < PACKET.size:
+            return
+        kind = data[PACKET.size - 1]
+        if kind == WELCOME:
+            self.player = data[PACKET.size]
+        elif kind == SNAPSHOT and len(data) >= PACKET.size + SNAPSHOT_BODY.size:
+            self.snapshots += 1
+            self.latest = max(self.latest, SNAPSHOT_BODY.unpack_from(data, PACKET.size)[0])
+
+    def send(self):
+        if self.player is None:
+            self.transport.sendto(packet(HELLO))
+            return
+        if self.rng.random() < 1 / 40:
+            self.bits = self.rng.randrange(16)
+        self.seq += 1
+        self.recent.append(self.bits)
+        first = self.seq - len(self.recent) + 1
+        self.transport.sendto(packet(INPUT, INPUT_BODY.pack(self.latest, first, len(self.recent)) + bytes(self.recent)))
+
+async def _load(host, port, count, seconds, seed):
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    clients = []
+    for _ in range(count):
+        _, client = await loop.create_datagram_endpoint(lambda: LoadClient(random.Random(rng.random())),
+                                                        remote_addr=(host, port))
+        clients.append(client)
+    tick_time = 1.0 / TICK_RATE
+    start = next_tick = time.perf_counter()
+    while next_tick - start < seconds:
+        for client in clients:
+            client.send()
+        next_tick += tick_time
+        await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+    for client in clients:
+        client.transport.close()
+    return [client.snapshots for client in clients]
+
+def _load_process(host, port, count, seconds, seed, results):
+    results.put(asyncio.run(_load(host, port, count, seconds, seed)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many Flagged matches in one process")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("serve", "host matches for net.py clients"),
+                            ("load", "host matches for local load-test clients and report")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--levels", nargs="+", default=sorted(LEVEL_OBSTACLES), choices=sorted(LEVEL_OBSTACLES))
+        command.add_argument("--speed", type=int, default=3)
+        command.add_argument("--report-every", type=float, default=5.0, help="seconds between reports")
+    serve = commands.choices["serve"]
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    load = commands.choices["load"]
+    load.add_argument("--matches", type=int, default=100)
+    load.add_argument("--seconds", type=float, default=20.0)
+    load.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(_serve(args.levels, args.speed, args.host, args.port, None, args.report_every,
+                           lambda address: print(f"Hosting on port {address[1]}")))
+        return
+
+    # The clients run in their own process so they do not steal the host's time
+    results = multiprocessing.Queue()
+
+    def start_clients(address):
+        process = multiprocessing.Process(target=_load_process, daemon=True,
+                                          args=(address[0], address[1], args.matches * 2, args.seconds, args.seed,
+                                                results))
+        process.start()
+
+    server = asyncio.run(_serve(args.levels, args.speed, "127.0.0.1", 0, args.seconds + 1, args.report_every,
+                                start_clients))
+    snapshots = results.get()
+    stats = server.stats
+    print(f"{args.matches} matches, {args.matches * 2} clients for {args.seconds:.0f}s: {stats.ticks} ticks, "
+          f"{stats.overruns} overruns ({stats.overruns / max(stats.ticks, 1):.1%}), {stats.skipped} skipped")
+    print(f"Snapshots per client per second: median {_percentile(snapshots, 50) / args.seconds:.1f}, "
+          f"lowest {min(snapshots) / args.seconds:.1f} (tick rate {TICK_RATE})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+import argparse
+import heapq
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+from levels import LEVEL_OBSTACLES
+from sim import TICK_RATE, WINNING_SCORE, FixedTimestep, MatchState, restore, snapshot, step
+
+# Network play over UDP. The server owns the match: clients send their
+# movement bits for every tick and the server steps the match with them and
+# answers every tick with the resulting state. Clients predict their own
+# player from their unacknowledged inputs, so movement shows at once, and
+# replay those inputs on top of every state the server sends.
+#
+#   python net.py serve --level WATER       # wait for two players
+#   python net.py join 192.168.1.20         # play in the game window
+#   python net.py test --rtt 100 --loss 0.05
+#
+# Every packet starts with PROTOCOL and a packet type:
+#   HELLO     client -> server, until WELCOME arrives
+#   WELCOME   player number (1 or 2), level and speed
+#   INPUT     newest snapshot tick received, sequence number of the first
+#             input, then the client's last few inputs, one byte each (a
+#             lost packet is covered by the next one)
+#   SNAPSHOT  tick, how many ticks back the snapshot it is a delta against
+#             is (0 for a full state), the last input sequence number used
+#             for the receiving player, a bit mask of the fields sent, then
+#             those fields
+PROTOCOL = b"FN"
+VERSION = 1
+HELLO, WELCOME, INPUT, SNAPSHOT = range(4)
+PACKET = struct.Struct("<2sBB")  # protocol, version, type
+WELCOME_BODY = struct.Struct("<B16sB")
+INPUT_BODY = struct.Struct("<IIB")
+SNAPSHOT_BODY = struct.Struct("<IBIH")
+
+DEFAULT_PORT = 5999
+INPUT_REDUNDANCY = 8  # inputs repeated in each INPUT packet
+HISTORY = 64  # snapshots kept for delta baselines
+MAX_QUEUE = 6  # queued inputs beyond this are dropped so a lagging player catches up
+HELLO_INTERVAL = 0.1
+LINGER = 1.0  # seconds the server keeps sending after the match ends
+
+# sim.snapshot() fields without the tick, which is in the snapshot header
+FIELD_FORMATS = "hhhh????BB"
+_field_structs = {}
+
+def _fields_struct(mask):
+    fields = _field_structs.get(mask)
+    if fields is None:
+        fields = _field_structs[mask] = struct.Struct(
+            "<" + "".join(fmt for i, fmt in enumerate(FIELD_FORMATS) if mask >> i & 1))
+    return fields
+
+# (mask, packed fields) of the fields of snap that differ from baseline
+def encode_delta(snap, baseline=None):
+    mask = 0
+    values = []
+    for i in range(len(FIELD_FORMATS)):
+        if baseline is None or snap[i] != baseline[i]:
+            mask |= 1 << i
+            values.append(snap[i])
+    return mask, _fields_struct(mask).pack(*values)
+
+def decode_delta(mask, data, tick, baseline=None):
+    values = iter(_fields_struct(mask).unpack(data))
+    return tuple(next(values) if mask >> i & 1 else baseline[i] for i in range(len(FIELD_FORMATS))) + (tick,)
+
+def packet(kind, body=b""):
+    return PACKET.pack(PROTOCOL, VERSION, kind) + body
+
+# Outgoing side of a socket with simulated one-way delay, jitter and packet
+# loss. Packets wait in a queue until flush() finds them due; with no delay
+# and no loss they go straight out. A connected socket is sent to with no
+# address, since BSD and macOS refuse sendto() on one.
+class LinkShim:
+    def __init__(self, sock, delay=0.0, jitter=0.0, loss=0.0, rng=None):
+        self.sock = sock
+        self.delay = delay
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = rng or random.Random()
+        self.queue = []
+        self.order = 0  # keeps packets due at the same time in send order
+        self.sent = 0
+        self.dropped = 0
+        self.bytes = 0
+
+    def sendto(self, data, address=None):
+        self.sent += 1
+        self.bytes += len(data)
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        if not (self.delay or self.jitter):
+            self._send(data, address)
+            return
+        due = time.perf_counter() + self.delay + self.rng.uniform(0, self.jitter)
+        self.order += 1
+        heapq.heappush(self.queue, (due, self.order, data, address))
+
+    def flush(self, now):
+        while self.queue and self.queue[0][0] <= now:
+            _, _, data, address = heapq.heappop(self.queue)
+            self._send(data, address)
+
+    def _send(self, data, address):
+        try:
+            if address is None:
+                self.sock.send(data)
+            else:
+                self.sock.sendto(data, address)
+        except ConnectionError:
+            pass  # an earlier packet bounced off a closed port; UDP just loses this one
+
+    # When the next held packet is due, or None
+    @property
+    def next_due(self):
+        return self.queue[0][0] if self.queue else None
+
+def _wait(sock, link, deadline):
+    due = link.next_due
+    if due is not None:
+        deadline = min(deadline, due)
+    select.select([sock], [], [], max(0.0, deadline - time.perf_counter()))
+
+def _receive(sock):
+    packets = []
+    while True:
+        try:
+            data, address = sock.recvfrom(2048)
+        except (BlockingIOError, InterruptedError):
+            return packets
+        except ConnectionError:
+            continue  # ICMP port unreachable: nobody listening yet, or a peer went away
+        if len(data) >= PACKET.size:
+            protocol, version, kind = PACKET.unpack_from(data)
+            if protocol == PROTOCOL and version == VERSION:
+                packets.append((kind, data[PACKET.size:], address))
+
+# One connected player on the server
+class _Seat:
+    def __init__(self, number, address):
+        self.number = number
+        self.address = address
+        self.inputs = deque()  # (sequence number, bits) not yet used
+        self.received = 0  # newest sequence number queued
+        self.used = 0  # sequence number of the input used on the last tick
+        self.bits = 0  # held until the next input arrives
+        self.acked = None  # newest snapshot tick the client has
+
+    def queue_inputs(self, first, bits):
+        for seq, value in enumerate(bits, first):
+            if seq > self.received:
+                self.inputs.append((seq, value))
+                self.received = seq
+        while len(self.inputs) > MAX_QUEUE:
+            self.used, self.bits = self.inputs.popleft()
+
+    def next_input(self):
+        if self.inputs:
+            self.used, self.bits = self.inputs.popleft()
+        return self.bits
+
+# One match as the server runs it: the authoritative state, the two seats
+# and recent snapshots for delta encoding. The match starts once both seats
+# are taken.
+class HostedMatch:
+    def __init__(self, level="FIRE", speed=3):
+        self.level = level
+        self.speed = speed
+        self.state = MatchState(level, speed)
+        self.seats = []
+        self.history = {0: snapshot(self.state)}
+
+    @property
+    def full(self):
+        return len(self.seats) == 2
+
+    # Seat a new player; returns the seat, or None if the match is full
+    def join(self, address):
+        if self.full:
+            return None
+        seat = _Seat(len(self.seats) + 1, address)
+        self.seats.append(seat)
+        return seat
+
+    def welcome(self, seat):
+        return packet(WELCOME, WELCOME_BODY.pack(seat.number, self.level.encode(), self.speed))
+
+    def receive_input(self, seat, body):
+        if len(body) < INPUT_BODY.size:
+            return
+        acked, first, count = INPUT_BODY.unpack_from(body)
+        seat.queue_inputs(first, body[INPUT_BODY.size:INPUT_BODY.size + count])
+        if seat.acked is None or acked > seat.acked:
+            seat.acked = acked
+
+    # End the match in the other player's favour, e.g. when seat went
+    # silent. It counts as one more tick so clients take the final snapshot.
+    def forfeit(self, seat):
+        state = self.state
+        if seat.number == 1:
+            state.score_p2 = WINNING_SCORE
+        else:
+            state.score_p1 = WINNING_SCORE
+        state.tick += 1
+
+    # Step one tick and add each player's snapshot packet to out as
+    # (data, address)
+    def tick(self, out):
+        state = self.state
+        player1, player2 = self.seats
+        step(state, player1.next_input(), player2.next_input())
+        snap = snapshot(state)
+        self.history[state.tick] = snap
+        self.history.pop(state.tick - HISTORY, None)
+        for seat in self.seats:
+            baseline = self.history.get(seat.acked)
+            mask, fields = encode_delta(snap, baseline)
+            body = SNAPSHOT_BODY.pack(state.tick, 0 if baseline is None else state.tick - seat.acked, seat.used, mask)
+            out.append((packet(SNAPSHOT, body + fields), seat.address))
+
+# Authoritative server for a single match between two players. It stops
+# shortly after someone wins.
+class Server:
+    def __init__(self, level="FIRE", speed=3, host="0.0.0.0", port=DEFAULT_PORT, delay=0.0, jitter=0.0, loss=0.0,
+                 seed=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+        self.link = LinkShim(self.sock, delay, jitter, loss, random.Random(seed))
+        self.match = HostedMatch(level, speed)
+        self.state = self.match.state
+        self.seats = {}
+        self.stopped = threading.Event()
+
+    def _handle(self, kind, body, address):
+        seat = self.seats.get(address)
+        if kind == HELLO:
+            if seat is None:
+                seat = self.match.join(address)
+                if seat is None:
+                    return
+                self.seats[address] = seat
+            self.link.sendto(self.match.welcome(seat), address)
+        elif kind == INPUT and seat is not None:
+            self.match.receive_input(seat, body)
+
+    def serve(self):
+        tick_time = 1.0 / TICK_RATE
+        next_tick = None
+        finished = None
+        out = []
+        while not self.stopped.is_set():
+            now = time.perf_counter()
+            self.link.flush(now)
+            for kind, body, address in _receive(self.sock):
+                self._handle(kind, body, address)
+            if self.match.full:
+                if next_tick is None:
+                    next_tick = now
+                # Catch up on missed ticks, but never by more than a few
+                while now >= next_tick:
+                    self.match.tick(out)
+                    next_tick = max(next_tick + tick_time, now - 4 * tick_time)
+                for data, address in out:
+                    self.link.sendto(data, address)
+                out.clear()
+                if self.state.winner and finished is None:
+                    finished = now
+                if finished is not None and now - finished > LINGER:
+                    break
+            _wait(self.sock, self.link, next_tick if next_tick is not None else now + HELLO_INTERVAL)
+        self.sock.close()
+
+    def stop(self):
+        self.stopped.set()
+
+# Client for one player. update() is called once per frame with the local
+# player's input and keeps state (what to draw) current: the server's
+# latest state plus, with prediction, this player's inputs the server has
+# not used yet.
+class Client:
+    def __init__(self, host, port=DEFAULT_PORT, predict=True, delay=0.0, jitter=0.0, loss=0.0, seed=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, port))  # also filters out packets from anyone else
+        self.sock.setblocking(False)
+        self.server = (host, port)
+        self.link = LinkShim(self.sock, delay, jitter, loss, random.Random(seed))
+        self.predict = predict
+        self.player = None
+        self.state = None
+        self.timestep = FixedTimestep()
+        self.seq = 0
+        self.pending = deque()  # (sequence number, bits) the server has not used yet
+        self.history = {}  # snapshots received, by tick
+        self.latest = None  # newest snapshot tick
+        self.latest_snapshot = None
+        self.input = 0
+        self.changed_at = None  # when the local input last changed, until it is shown
+
+        # Measurements: (time to show, time to confirm) per input change,
+        # and prediction corrections in pixels
+        self.shown = []
+        self.confirmed = []
+        self.waiting = {}  # sequence number -> when its input change was made
+        self.corrections = []
+        self.snapshots = 0
+        self.snapshot_bytes = 0
+
+    # Join the server's match; returns the player number
+    def connect(self, timeout=10.0):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            self.link.sendto(packet(HELLO))
+            self.link.flush(time.perf_counter())
+            _wait(self.sock, self.link, time.perf_counter() + HELLO_INTERVAL)
+            for kind, body, _ in self._receive():
+                if kind == WELCOME and len(body) >= WELCOME_BODY.size:
+                    player, level, speed = WELCOME_BODY.unpack_from(body)
+                    self.player = player
+                    self.state = MatchState(level.rstrip(b"\0").decode(), speed)
+                    self.history[0] = self.latest_snapshot = snapshot(self.state)
+                    self.latest = 0
+                    return player
+        raise TimeoutError(f"no answer from {self.server[0]}:{self.server[1]}")
+
+    @property
+    def started(self):
+        return self.snapshots > 0
+
+    def _receive(self):
+        return _receive(self.sock)
+
+    def _apply(self, body, now):
+        if len(body) < SNAPSHOT_BODY.size:
+            return
+        tick, back, used, mask = SNAPSHOT_BODY.unpack_from(body)
+        if tick <= self.latest:
+            return  # late or duplicate
+        baseline = None
+        if back:
+            baseline = self.history.get(tick - back)
+            if baseline is None:
+                return  # baseline already forgotten; a later snapshot will do
+        snap = decode_delta(mask, body[SNAPSHOT_BODY.size:], tick, baseline)
+        self.snapshots += 1
+        self.snapshot_bytes += PACKET.size + len(body)
+        self.history[tick] = self.latest_snapshot = snap
+        self.latest = tick
+        for old in [old for old in self.history if old <= tick - HISTORY]:
+            del self.history[old]
+
+        while self.pending and self.pending[0][0] <= used:
+            self.pending.popleft()
+        for seq in [seq for seq in self.waiting if seq <= used]:
+            changed_at = self.waiting.pop(seq)
+            self.confirmed.append(now - changed_at)
+            if not self.predict:
+                self.shown.append(now - changed_at)
+        self._rebuild()
+
+    # The server's state with the unacknowledged local inputs replayed on top
+    def _rebuild(self):
+        state = self.state
+        before = (self._local().x, self._local().y)
+        restore(state, self.latest_snapshot)
+        if self.predict:
+            for _, bits in self.pending:
+                self._step(bits)
+            local = self._local()
+            error = abs(local.x - before[0]) + abs(local.y - before[1])
+            if error:
+                self.corrections.append(error)
+
+    def _local(self):
+        return self.state.player1 if self.player == 1 else self.state.player2
+
+    # The other player holds still in predictions
+    def _step(self, bits):
+        if self.player == 1:
+            step(self.state, bits, 0)
+        else:
+            step(self.state, 0, bits)
+
+    def update(self, local_input, now=None):
+        now = time.perf_counter() if now is None else now
+        self.link.flush(now)
+        for kind, body, _ in self._receive():
+            if kind == SNAPSHOT:
+                self._apply(body, now)
+
+        # The match starts with the server's first snapshot, once both
+        # players have joined; until then nothing is predicted or queued
+        if not self.started:
+            self.timestep.reset(now)
+            self.link.flush(now)
+            return
+
+        if local_input != self.input:
+            self.input = local_input
+            self.changed_at = now
+        for _ in range(self.timestep.advance(now)):
+            self.seq += 1
+            self.pending.append((self.seq, self.input))
+            if self.changed_at is not None:
+                self.waiting[self.seq] = self.changed_at
+                if self.predict:
+                    self.shown.append(now - self.changed_at)
+                self.changed_at = None
+            if self.predict:
+                self._step(self.input)
+            recent = list(self.pending)[-INPUT_REDUNDANCY:]
+            body = INPUT_BODY.pack(self.latest, recent[0][0], len(recent)) + bytes(bits for _, bits in recent)
+            self.link.sendto(packet(INPUT, body))
+        self.link.flush(now)
+
+    def close(self):
+        self.sock.close()
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+# Two bot clients against a server on localhost, with the given round trip
+# time and loss applied to every packet in both directions
+def loopback_test(level, speed, seconds, rtt, jitter, loss, predict, seed):
+    from bots import Bot  # bots import the navigation caches; only needed here
+
+    server = Server(level, speed, "127.0.0.1", 0, rtt / 2, jitter, loss, seed)
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    clients = [Client("127.0.0.1", server.address[1], predict, rtt / 2, jitter, loss, seed + i + 1) for i in range(2)]
+    for client in clients:
+        client.connect()
+    rng = random.Random(seed)
+    bots = [Bot(level, client.player, rng, 0.02) for client in clients]
+
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end and thread.is_alive():
+        for client, bot in zip(clients, bots):
+            client.update(bot(client.state))
+        time.sleep(0.002)
+    server.stop()
+    thread.join()
+    for client in clients:
+        client.close()
+    return server, clients
+
+def main():
+    parser = argparse.ArgumentParser(description="Flagged over UDP")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="host a match for two players")
+    serve.add_argument("--level", default="FIRE", choices=sorted(LEVEL_OBSTACLES))
+    serve.add_argument("--speed", type=int, default=3)
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    join = commands.add_parser("join", help="play a match hosted elsewhere in the game window")
+    join.add_argument("host")
+    join.add_argument("--port", type=int, default=DEFAULT_PORT)
+    join.add_argument("--no-predict", action="store_true", help="only show what the server sends")
+
+    test = commands.add_parser("test", help="two bots over localhost with simulated latency and loss")
+    test.add_argument("--level", default="FIRE", choices=sorted(LEVEL_OBSTACLES))
+    test.add_argument("--speed", type=int, default=3)
+    test.add_argument("--seconds", type=float, default=10.0)
+    test.add_argument("--rtt", type=float, default=100.0, help="round trip time in ms")
+    test.add_argument("--jitter", type=float, default=10.0, help="extra random one-way delay in ms, up to")
+    test.add_argument("--loss", type=float, default=0.02, help="chance of losing each packet")
+    test.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = Server(args.level, args.speed, args.host, args.port)
+        print(f"Serving {args.level} at speed {args.speed} on port {server.address[1]}, waiting for two players")
+        server.serve()
+        print(f"Final score {server.state.score_p1} - {server.state.score_p2}")
+    elif args.command == "join":
+        client = Client(args.host, args.port, not args.no_predict)
+        print(f"Joined as player {client.connect()}, waiting for the other player")
+        import game
+        state = game.start_net_game(client)
+        print(f"Final score {state.score_p1} - {state.score_p2}")
+    else:
+        for predict in (True, False):
+            server, clients = loopback_test(args.level, args.speed, args.seconds, args.rtt / 1000,
+                                            args.jitter / 1000, args.loss, predict, args.seed)
+            shown = [t for client in clients for t in client.shown]
+            confirmed = [t for client in clients for t in client.confirmed]
+            corrections = [c for client in clients for c in client.corrections]
+            snapshots = sum(client.snapshots for client in clients)
+            full = PACKET.size + SNAPSHOT_BODY.size + _fields_struct((1 << len(FIELD_FORMATS)) - 1).size
+            average = sum(client.snapshot_bytes for client in clients) / max(snapshots, 1)
+            lost = server.link.dropped + sum(client.link.dropped for client in clients)
+            sent = server.link.sent + sum(client.link.sent for client in clients)
+            print(f"{'prediction' if predict else 'no prediction'}: {args.rtt:.0f} ms RTT, {args.loss:.0%} loss, "
+                  f"server tick {server.state.tick}, score {server.state.score_p1} - {server.state.score_p2}")
+            print(f"  input shown after    median {_percentile(shown, 50) * 1000:6.1f} ms, "
+                  f"p95 {_percentile(shown, 95) * 1000:6.1f} ms ({len(shown)} input changes)")
+            print(f"  server confirmed     median {_percentile(confirmed, 50) * 1000:6.1f} ms, "
+                  f"p95 {_percentile(confirmed, 95) * 1000:6.1f} ms")
+            print(f"  corrections          {len(corrections)}, median {_percentile(corrections, 50):.0f} px")
+            print(f"  snapshots            {snapshots} received, {average:.1f} bytes on average ({full} full), "
+                  f"{lost} of {sent} packets lost")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import csv
+import os
+from array import array
+from time import perf_counter
+
+import pygame
+
+OVERLAY_REFRESH = 30  # frames between overlay text updates
+OVERLAY_COLOR = (255, 255, 255)
+OVERLAY_BG = (0, 0, 0)
+# profile_<name>.csv files go next to the game, wherever it is started from
+PROFILE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Per-phase frame timings kept in a fixed-size ring buffer. Call
+# begin_frame(), mark(phase) after each phase and end_frame(); mark()
+# charges the time since the previous mark to that phase. While disabled
+# every call returns straight away.
+class FrameProfiler:
+    def __init__(self, name, phases, capacity=600):
+        self.name = name
+        self.phases = tuple(phases)
+        self.capacity = capacity
+        self.enabled = False
+        self.requested = False
+        self.frames = 0  # frames recorded since the last reset
+
+        self._index = {phase: i for i, phase in enumerate(self.phases)}
+        self._samples = array("d", bytes(8 * capacity * len(self.phases)))
+        self._frame_times = array("d", bytes(8 * capacity))
+        self._zero_row = array("d", bytes(8 * len(self.phases)))
+        self._row = 0
+        self._frame_start = 0.0
+        self._last = 0.0
+        self._lines = []  # overlay text surfaces
+
+    # Switch on or off; takes effect at the next begin_frame()
+    def toggle(self):
+        self.requested = not self.requested
+
+    def reset(self):
+        self.frames = 0
+        self._lines = []
+
+    def begin_frame(self):
+        if self.requested != self.enabled:
+            self.enabled = self.requested
+        if not self.enabled:
+            return
+        width = len(self.phases)
+        self._row = (self.frames % self.capacity) * width
+        self._samples[self._row:self._row + width] = self._zero_row
+        self._frame_start = self._last = perf_counter()
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = perf_counter()
+        self._samples[self._row + self._index[phase]] += now - self._last
+        self._last = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self._frame_times[self.frames % self.capacity] = perf_counter() - self._frame_start
+        self.frames += 1
+
+    # Recorded frames, oldest first, as (frame_number, frame_time, phase_times)
+    def samples(self):
+        count = min(self.frames, self.capacity)
+        width = len(self.phases)
+        for n in range(self.frames - count, self.frames):
+            slot = n % self.capacity
+            yield n, self._frame_times[slot], self._samples[slot * width:(slot + 1) * width]
+
+    # {phase: (p50, p95, p99)} in milliseconds, including the whole "frame"
+    def percentiles(self, points=(50, 95, 99)):
+        columns = {phase: [] for phase in ("frame",) + self.phases}
+        for _, frame_time, phase_times in self.samples():
+            columns["frame"].append(frame_time)
+            for phase, value in zip(self.phases, phase_times):
+                columns[phase].append(value)
+        result = {}
+        for phase, values in columns.items():
+            if not values:
+                continue
+            values.sort()
+            result[phase] = tuple(values[min(len(values) - 1, int(len(values) * p / 100))] * 1000 for p in points)
+        return result
+
+    def dump_csv(self, path=None):
+        if not self.frames:
+            return None
+        path = path or os.path.join(PROFILE_DIR, f"profile_{self.name}.csv")
+        try:
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", "frame_ms"] + [f"{phase}_ms" for phase in self.phases])
+                for n, frame_time, phase_times in self.samples():
+                    writer.writerow([n, f"{frame_time * 1000:.4f}"] +
+                                    [f"{value * 1000:.4f}" for value in phase_times])
+        except OSError:
+            return None  # read-only tree: the profile is lost, the game still exits cleanly
+        return path
+
+    # Text overlay with p50/p95/p99 per phase; returns the area drawn. The
+    # lines are rendered straight from the font when they are refreshed and
+    # kept here: their numbers rarely repeat, so going through the shared
+    # text cache would only push the menu and score labels out of it.
+    def draw_overlay(self, surface, font, pos=(10, 60)):
+        if not self.enabled:
+            return None
+        if not self._lines or self.frames % OVERLAY_REFRESH == 0:
+            lines = [f"{phase:<10} {p50:6.2f} {p95:6.2f} {p99:6.2f}"
+                     for phase, (p50, p95, p99) in self.percentiles().items()]
+            lines.insert(0, f"{self.name} ms   p50    p95    p99")
+            self._lines = [font.render(line, True, OVERLAY_COLOR) for line in lines]
+        x, y = pos
+        area = pygame.Rect(x, y, 0, 0)
+        for text in self._lines:
+            rect = pygame.Rect((x, y), text.get_size())
+            surface.fill(OVERLAY_BG, rect)
+            surface.blit(text, rect)
+            area.union_ip(rect)
+            y += rect.height
+        return area
+
+profilers = []
+
+def add_profiler(name, phases, capacity=600):
+    profiler = FrameProfiler(name, phases, capacity)
+    profilers.append(profiler)
+    return profiler
+
+def toggle_all():
+    for profiler in profilers:
+        profiler.toggle()
+
+# Write every profiler that recorded frames to CSV (called when game.run() returns or raises)
+def dump_all():
+    return [path for path in (profiler.dump_csv() for profiler in profilers) if path]
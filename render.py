@@ -0,0 +1,183 @@
+from collections import OrderedDict
+
+import pygame
+
+try:
+    import numpy as np
+except ImportError:  # fall back to drawing gradients line by line
+    np = None
+
+from levels import LEVEL_COLORS, LEVEL_OBSTACLES, OBSTACLE_COLORS
+
+BLACK = (0, 0, 0)
+
+_gradients = {}
+_backgrounds = {}
+
+def _convert(surface):
+    # Match the display format once a window exists so blits stay cheap
+    return surface.convert() if pygame.display.get_surface() else surface
+
+def _fill_gradient(surface, top_color, bottom_color, height):
+    # One color per row, same rounding as the original per-line loop:
+    # int(top + (bottom - top) * i / height)
+    width = surface.get_width()
+    if np is not None:
+        top = np.array(top_color, dtype=np.float64)
+        diff = np.array(bottom_color, dtype=np.float64) - top
+        rows = np.arange(surface.get_height(), dtype=np.float64)[:, None]
+        colors = (top + diff * rows / height).astype(np.uint8)
+        pixels = pygame.surfarray.pixels3d(surface)
+        pixels[:] = colors[None, :, :]
+        del pixels
+        return
+    for i in range(surface.get_height()):
+        r = int(top_color[0] + (bottom_color[0] - top_color[0]) * i / height)
+        g = int(top_color[1] + (bottom_color[1] - top_color[1]) * i / height)
+        b = int(top_color[2] + (bottom_color[2] - top_color[2]) * i / height)
+        pygame.draw.line(surface, (r, g, b), (0, i), (width, i))
+
+# Vertical gradient surface, built once per size and color pair
+def gradient_surface(size, top_color, bottom_color):
+    key = (tuple(size), tuple(top_color), tuple(bottom_color))
+    surface = _gradients.get(key)
+    if surface is None:
+        surface = pygame.Surface(size)
+        _fill_gradient(surface, top_color, bottom_color, size[1])
+        surface = _gradients[key] = _convert(surface)
+    return surface
+
+def draw_base(surface, base, color):
+    # Black outer border
+    pygame.draw.rect(surface, BLACK, base.inflate(4, 4), 7)
+    # Colored middle border
+    pygame.draw.rect(surface, color, base, 5)
+    # Black inner border
+    pygame.draw.rect(surface, BLACK, base.inflate(-4, -4), 3)
+
+# Static layer of a level: gradient, bases and obstacles. Players and flags
+# never overlap obstacles, so drawing them on top keeps the original look.
+def level_background(level, size, base1, base2):
+    colors = LEVEL_COLORS[level]
+    key = (level, colors["gradient_top"], colors["gradient_bottom"], colors["p1_color"],
+           colors["p2_color"], tuple(size), tuple(base1), tuple(base2))
+    surface = _backgrounds.get(key)
+    if surface is None:
+        surface = gradient_surface(size, colors["gradient_top"], colors["gradient_bottom"]).copy()
+        draw_base(surface, base1, colors["p1_color"])
+        draw_base(surface, base2, colors["p2_color"])
+        for obs in LEVEL_OBSTACLES[level]:
+            # Fill with level color
+            pygame.draw.rect(surface, OBSTACLE_COLORS[level], obs)
+            # Add black border
+            pygame.draw.rect(surface, BLACK, obs, 2)
+        _backgrounds[key] = surface
+    return surface
+
+# Renders a match frame over a cached static background. With dirty
+# rects enabled only the regions drawn last frame are restored and only
+# those plus this frame's regions are pushed to the display; otherwise the
+# whole background is blitted and the display flipped.
+#
+# The regions live in two pools of Rects kept from frame to frame (this
+# frame's and last frame's, swapped on present; unused ones are empty), so
+# a steady frame copies coordinates instead of allocating Rects and lists.
+class DirtyRectRenderer:
+    def __init__(self, enabled=True, capacity=16):
+        self.enabled = enabled
+        self.background = None
+        self.full = True
+        self.count = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.previous = [pygame.Rect(0, 0, 0, 0) for _ in range(capacity)]
+        self.current = [pygame.Rect(0, 0, 0, 0) for _ in range(capacity)]
+        self.dirty = self.previous + self.current  # both pools, for display.update
+        self._restore_previous = self._restore_current = None
+
+    # (background, rect, rect) blits restoring each pool's regions
+    def _restore_lists(self):
+        self._restore_previous = [(self.background, rect, rect) for rect in self.previous]
+        self._restore_current = [(self.background, rect, rect) for rect in self.current]
+
+    # Force a full redraw next frame, e.g. after a menu covered the screen
+    def invalidate(self):
+        self.background = None
+
+    def begin(self, screen, background):
+        if not self.enabled or background is not self.background:
+            self.background = background
+            self.full = True
+            screen.blit(background, (0, 0))
+            self._restore_previous = self._restore_current = None
+        else:
+            self.full = False
+            if self._restore_previous is None:
+                self._restore_lists()
+            screen.blits(self._restore_previous, doreturn=False)
+        self.count = 0
+
+    # Register a region drawn this frame
+    def add(self, rect):
+        if self.enabled:
+            if self.count == len(self.current):
+                self._grow()
+            self.current[self.count].update(rect)
+            self.count += 1
+
+    # More regions than the pools hold: double them, keeping this frame's
+    def _grow(self):
+        count, current = self.count, self.current
+        self._allocate(2 * len(current))
+        for i in range(count):
+            self.current[i].update(current[i])
+        self.full = True  # last frame's regions are gone, so push the whole screen once
+
+    def present(self):
+        if self.full:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.dirty)
+        self.previous, self.current = self.current, self.previous
+        self._restore_previous, self._restore_current = self._restore_current, self._restore_previous
+        for rect in self.current:
+            rect.width = 0
+
+# Bounded LRU cache of rendered text surfaces keyed by (font, text, color, antialias).
+# hits/misses show whether a steady frame still rasterizes glyphs.
+class TextCache:
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, color, antialias)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self._surfaces[key] = font.render(text, antialias, color)
+        if len(self._surfaces) > self.max_size:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self._surfaces.clear()
+        self.reset_stats()
+
+text_cache = TextCache()
+render_text = text_cache.render
+
+def clear_caches():
+    _gradients.clear()
+    _backgrounds.clear()
+    text_cache.clear()
@@ -0,0 +1,131 @@
+import argparse
+import os
+import struct
+import time
+import zlib
+
+from levels import LEVEL_OBSTACLES, load_level
+from sim import MatchState, step
+
+# Replay file: fixed header followed by one byte per tick holding both
+# players' movement bits (player 1 in the low nibble, player 2 in the high).
+#
+# magic, version, level name, player_speed, level checksum, tick count,
+# final score_p1, score_p2, final player1 x/y, player2 x/y
+HEADER = struct.Struct("<4sB16sBIIBBhhhh")
+MAGIC = b"FLGR"
+VERSION = 2  # 2: the level checksum covers bases, flags and spawns too
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replays")
+
+class ReplayError(Exception):
+    pass
+
+# Identifies the layout a replay was recorded on: obstacles, bases, flags
+# and spawn points, everything that decides how the inputs play out
+def level_checksum(level):
+    layout = load_level(level)
+    rects = list(layout.obstacles) + [layout.base1, layout.base2, layout.flag1, layout.flag2]
+    points = [f"{r.x}:{r.y}:{r.w}:{r.h}" for r in rects] + [f"{x}:{y}" for x, y in (layout.spawn1, layout.spawn2)]
+    return zlib.crc32(",".join(points).encode())
+
+class Replay:
+    def __init__(self, level, speed, inputs=b"", checksum=None, final=None):
+        self.level = level
+        self.speed = speed
+        self.inputs = bytearray(inputs)
+        self.checksum = level_checksum(level) if checksum is None else checksum
+        self.final = final  # (score_p1, score_p2, p1x, p1y, p2x, p2y) once finished
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def record(self, p1_input, p2_input):
+        self.inputs.append(p1_input | p2_input << 4)
+
+    # Inputs for tick n as (p1_input, p2_input)
+    def tick_inputs(self, n):
+        bits = self.inputs[n]
+        return bits & 15, bits >> 4
+
+    def finish(self, state):
+        self.final = final_tuple(state)
+
+    def save(self, path):
+        if self.final is None:
+            raise ReplayError("replay has no final state; call finish() first")
+        header = HEADER.pack(MAGIC, VERSION, self.level.encode(), self.speed, self.checksum,
+                             len(self.inputs), *self.final)
+        with open(path, "wb") as f:
+            f.write(header)
+            f.write(self.inputs)
+
+def final_tuple(state):
+    return (state.score_p1, state.score_p2, state.player1.x, state.player1.y,
+            state.player2.x, state.player2.y)
+
+def load(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ReplayError(f"{path}: file too short")
+    magic, version, level, speed, checksum, ticks, *final = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ReplayError(f"{path}: not a version {VERSION} Flagged replay")
+    level = level.rstrip(b"\0").decode()
+    if level not in LEVEL_OBSTACLES:
+        raise ReplayError(f"{path}: unknown level {level}")
+    if checksum != level_checksum(level):
+        raise ReplayError(f"{path}: level {level} has changed since this replay was recorded")
+    inputs = data[HEADER.size:]
+    if len(inputs) != ticks:
+        raise ReplayError(f"{path}: expected {ticks} ticks, found {len(inputs)}")
+    return Replay(level, speed, inputs, checksum, tuple(final))
+
+def default_path(level):
+    os.makedirs(REPLAY_DIR, exist_ok=True)
+    return os.path.join(REPLAY_DIR, time.strftime(f"%Y%m%d-%H%M%S-{level}.flgr"))
+
+# Feed the log through the same step function as the game, as fast as possible
+def run(replay):
+    state = MatchState(replay.level, replay.speed)
+    for n in range(len(replay)):
+        p1_input, p2_input = replay.tick_inputs(n)
+        step(state, p1_input, p2_input)
+    return state
+
+# True if replaying the log reproduces the recorded final scores and positions
+def verify(replay, state=None):
+    state = state or run(replay)
+    return final_tuple(state) == replay.final
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded Flagged match")
+    parser.add_argument("path")
+    parser.add_argument("--render", action="store_true", help="play back in the game window instead of headless")
+    parser.add_argument("--capture", choices=("png", "raw"), help="with --render, save the frames under captures/")
+    args = parser.parse_args()
+
+    replay = load(args.path)
+    print(f"{args.path}: {replay.level}, speed {replay.speed}, {len(replay)} ticks")
+
+    if args.render:
+        import game
+        game.capture_frames = bool(args.capture)
+        game.capture_format = args.capture or game.capture_format
+        state = game.start_game(replay=replay)
+        if game.last_capture:
+            print(game.last_capture.summary())
+    else:
+        start = time.perf_counter()
+        state = run(replay)
+        elapsed = time.perf_counter() - start
+        print(f"Replayed in {elapsed:.3f}s ({len(replay) / max(elapsed, 1e-9):,.0f} ticks/s)")
+
+    print(f"Final score {state.score_p1} - {state.score_p2}")
+    if not verify(replay, state):
+        print(f"MISMATCH: recorded {replay.final}, replayed {final_tuple(state)}")
+        raise SystemExit(1)
+    print("Replay matches the recorded result")
+
+if __name__ == "__main__":
+    main()
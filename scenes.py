@@ -0,0 +1,59 @@
+# Screens are Scene objects on a stack owned by a single main loop, so
+# moving between menus and matches never nests one loop inside another.
+class Scene:
+    # Called for every event the main loop does not handle itself
+    def handle_event(self, event):
+        pass
+
+    # Called when the scene above this one is popped
+    def resume(self):
+        pass
+
+    # Advance and draw one frame
+    def frame(self, screen):
+        pass
+
+    # Push the finished frame to the display
+    def present(self, screen):
+        pass
+
+# Stack of scenes. Changes requested during a frame (usually from a button
+# action or an event handler) are applied between frames by apply().
+class SceneManager:
+    def __init__(self):
+        self.stack = []
+        self._pending = []
+
+    @property
+    def top(self):
+        return self.stack[-1] if self.stack else None
+
+    def push(self, scene):
+        self._pending.append(("push", scene))
+
+    def pop(self):
+        self._pending.append(("pop", None))
+
+    # Replace the top scene
+    def replace(self, scene):
+        self._pending.append(("replace", scene))
+
+    # Drop every scene and start over with this one (None empties the stack)
+    def switch(self, scene):
+        self._pending.append(("switch", scene))
+
+    @property
+    def changed(self):
+        return bool(self._pending)
+
+    def apply(self):
+        for op, scene in self._pending:
+            if op in ("pop", "replace") and self.stack:
+                self.stack.pop()
+            elif op == "switch":
+                self.stack.clear()
+            if scene is not None and op != "pop":
+                self.stack.append(scene)
+            elif op == "pop" and self.stack:
+                self.stack[-1].resume()
+        self._pending.clear()
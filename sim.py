@@ -0,0 +1,204 @@
+import argparse
+import random
+import struct
+import time
+
+import pygame
+
+from levelcache import level_grid
+from levels import SCREEN_WIDTH, SCREEN_HEIGHT, LEVEL_OBSTACLES, load_level
+
+# Input bits, one nibble per player (W/S/A/D or UP/DOWN/LEFT/RIGHT)
+UP = 1
+DOWN = 2
+LEFT = 4
+RIGHT = 8
+
+WINNING_SCORE = 3
+
+# Simulation ticks per second. Speeds are whole pixels per tick, so this
+# also sets how fast players move across the screen.
+TICK_RATE = 60
+
+PLAYER_SIZE = 50
+
+SCREEN_RECT = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+# Match state, kept free of any display or event handling so the same
+# rules can run inside the window loop or headless at full speed
+class MatchState:
+    def __init__(self, level="FIRE", speed=3):
+        layout = load_level(level)
+
+        self.level = level
+        self.speed = speed
+        self.obstacles = layout.obstacles
+        self.grid = level_grid(level)
+
+        # Spawns, bases and flags come from the level file
+        self.player1 = pygame.Rect(layout.spawn1, (PLAYER_SIZE, PLAYER_SIZE))
+        self.player2 = pygame.Rect(layout.spawn2, (PLAYER_SIZE, PLAYER_SIZE))
+        self.base1 = layout.base1.copy()
+        self.base2 = layout.base2.copy()
+        self.flag1 = layout.flag1.copy()
+        self.flag2 = layout.flag2.copy()
+
+        self.flag1_captured = False
+        self.flag2_captured = False
+        self.holder_p1 = False
+        self.holder_p2 = False
+        self.score_p1 = 0
+        self.score_p2 = 0
+        self.tick = 0
+
+    @property
+    def winner(self):
+        if self.score_p1 >= WINNING_SCORE:
+            return "Player 1"
+        if self.score_p2 >= WINNING_SCORE:
+            return "Player 2"
+        return None
+
+def _move(player, bits, speed):
+    if bits & UP: player.y -= speed
+    if bits & DOWN: player.y += speed
+    if bits & LEFT: player.x -= speed
+    if bits & RIGHT: player.x += speed
+
+# Advance the match by one tick. Does nothing once a player has won.
+def step(state, p1_input, p2_input):
+    if state.winner:
+        return
+
+    player1 = state.player1
+    player2 = state.player2
+    prev_p1_x, prev_p1_y = player1.x, player1.y
+    prev_p2_x, prev_p2_y = player2.x, player2.y
+
+    _move(player1, p1_input, state.speed)
+    _move(player2, p2_input, state.speed)
+
+    # Screen bounds
+    player1.clamp_ip(SCREEN_RECT)
+    player2.clamp_ip(SCREEN_RECT)
+
+    # Obstacles (roll back to the position before this tick's move)
+    if state.grid.collides(player1): player1.topleft = prev_p1_x, prev_p1_y
+    if state.grid.collides(player2): player2.topleft = prev_p2_x, prev_p2_y
+
+    # Flags
+    if player1.colliderect(state.flag2) and not state.holder_p1:
+        state.holder_p1 = True
+        state.flag2_captured = True
+    if player2.colliderect(state.flag1) and not state.holder_p2:
+        state.holder_p2 = True
+        state.flag1_captured = True
+
+    if state.holder_p1 and state.base1.contains(player1):
+        state.score_p1 += 1
+        state.holder_p1 = False
+        state.flag2_captured = False
+
+    if state.holder_p2 and state.base2.contains(player2):
+        state.score_p2 += 1
+        state.holder_p2 = False
+        state.flag1_captured = False
+
+    # Tagging
+    if player1.colliderect(player2):
+        state.holder_p1 = state.holder_p2 = False
+        state.flag1_captured = state.flag2_captured = False
+
+    state.tick += 1
+
+# Everything that changes during a match as one flat tuple:
+#   (p1 x, p1 y, p2 x, p2 y, flag1 captured, flag2 captured,
+#    p1 holding, p2 holding, p1 score, p2 score, tick)
+# Level, speed, bases and flags are fixed for a match and not included, so a
+# snapshot only restores into a state of the same level and speed. Taking
+# one allocates a single tuple and restoring allocates nothing, cheap
+# enough for search that clones the match at every node.
+def snapshot(state):
+    player1, player2 = state.player1, state.player2
+    return (player1.x, player1.y, player2.x, player2.y, state.flag1_captured, state.flag2_captured,
+            state.holder_p1, state.holder_p2, state.score_p1, state.score_p2, state.tick)
+
+def restore(state, snap):
+    (state.player1.x, state.player1.y, state.player2.x, state.player2.y, state.flag1_captured,
+     state.flag2_captured, state.holder_p1, state.holder_p2, state.score_p1, state.score_p2, state.tick) = snap
+
+# Snapshots packed into 18 bytes, for storing many of them (e.g. search
+# trees or transposition tables)
+SNAPSHOT = struct.Struct("<4h4?2BI")
+
+def pack_snapshot(snap):
+    return SNAPSHOT.pack(*snap)
+
+def unpack_snapshot(data):
+    return SNAPSHOT.unpack(data)
+
+# Play on from snap for up to ticks ticks (or until someone wins), leaving
+# the result in state. Policies map a MatchState to an input bitmask.
+# Returns the score difference from player 1's side at the end.
+def rollout(state, snap, policy1, policy2, ticks):
+    restore(state, snap)
+    end = state.tick + ticks
+    while state.tick < end and not state.winner:
+        step(state, policy1(state), policy2(state))
+    return state.score_p1 - state.score_p2
+
+# Accumulator for running the simulation at a fixed rate independent of the
+# render rate. advance() returns how many ticks to step this frame and alpha
+# is how far the display is between the last two ticks (for interpolation).
+class FixedTimestep:
+    def __init__(self, rate=TICK_RATE, max_frame_time=0.25):
+        self.tick_time = 1.0 / rate
+        self.max_frame_time = max_frame_time  # avoid a catch-up spiral after a long stall
+        self.accumulator = 0.0
+        self.last_time = None
+
+    # Forget elapsed time, e.g. after the game was paused
+    def reset(self, now=None):
+        self.last_time = now
+        self.accumulator = 0.0
+
+    def advance(self, now):
+        if self.last_time is not None:
+            self.accumulator += min(now - self.last_time, self.max_frame_time)
+        self.last_time = now
+        ticks = int(self.accumulator / self.tick_time)
+        self.accumulator -= ticks * self.tick_time
+        return ticks
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.tick_time
+
+def random_policy(rng):
+    return lambda state: rng.randrange(16)
+
+# Run a match with no window. Policies map a MatchState to an input bitmask.
+def run_headless(level, speed, policy1, policy2, max_ticks):
+    state = MatchState(level, speed)
+    while state.tick < max_ticks and not state.winner:
+        step(state, policy1(state), policy2(state))
+    return state
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Flagged matches without a window")
+    parser.add_argument("--level", default="FIRE", choices=sorted(LEVEL_OBSTACLES))
+    parser.add_argument("--speed", type=int, default=3)
+    parser.add_argument("--ticks", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    state = run_headless(args.level, args.speed, random_policy(rng), random_policy(rng), args.ticks)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.level}: {state.tick} ticks in {elapsed:.3f}s ({state.tick / elapsed:,.0f} ticks/s)")
+    print(f"Score {state.score_p1} - {state.score_p2}, winner: {state.winner or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from batch import X, Y, W, H, _collide
+from bots import CHASE_RANGE, NAV_CELL, NAV_COLS, NAV_ROWS, WANDER_TICKS, nav_grid
+from levels import SCREEN_WIDTH, SCREEN_HEIGHT, LEVEL_OBSTACLES, load_level
+from sim import UP, DOWN, LEFT, RIGHT, WINNING_SCORE, PLAYER_SIZE, MatchState, step
+
+TEAM_SIZES = (1, 4, 8)
+SPAWN_SPACING = PLAYER_SIZE + 5
+
+# Free spawn slots nearest to a team's spawn point, on a lattice so
+# teammates start side by side without overlapping obstacles
+def spawn_positions(obstacles, spawn, count):
+    slots = []
+    for col in range(-SCREEN_WIDTH // SPAWN_SPACING, SCREEN_WIDTH // SPAWN_SPACING + 1):
+        for row in range(-SCREEN_HEIGHT // SPAWN_SPACING, SCREEN_HEIGHT // SPAWN_SPACING + 1):
+            x = spawn[0] + col * SPAWN_SPACING
+            y = spawn[1] + row * SPAWN_SPACING
+            if not (0 <= x <= SCREEN_WIDTH - PLAYER_SIZE and 0 <= y <= SCREEN_HEIGHT - PLAYER_SIZE):
+                continue
+            if any(obs.colliderect((x, y, PLAYER_SIZE, PLAYER_SIZE)) for obs in obstacles):
+                continue
+            slots.append((col * col + row * row, abs(row), x, y))
+    slots.sort()
+    if len(slots) < count:
+        raise ValueError(f"no room for {count} players per team")
+    return [(x, y) for _, _, x, y in slots[:count]]
+
+# Up to this many players, testing every pair at once beats sorting for a
+# sweep (about 8us against 28us for 8 players, 28us against 43us for 64)
+PAIR_SCAN_LIMIT = 64
+_all_pairs = {}  # player count -> index arrays of every pair
+
+# Index pairs (i, j) of overlapping players
+def overlapping_pairs(x, y):
+    if len(x) <= PAIR_SCAN_LIMIT:
+        return _scan_pairs(x, y)
+    return _sweep_pairs(x, y)
+
+def _scan_pairs(x, y):
+    pairs = _all_pairs.get(len(x))
+    if pairs is None:
+        pairs = _all_pairs[len(x)] = np.triu_indices(len(x), 1)
+    first, second = pairs
+    hit = (np.abs(x[first] - x[second]) < PLAYER_SIZE) & (np.abs(y[first] - y[second]) < PLAYER_SIZE)
+    return first[hit], second[hit]
+
+# Sweep and prune: with the players sorted by x, each is only compared with
+# the ones that follow it within PLAYER_SIZE, so the cost grows with the
+# players actually close together rather than with every pair
+def _sweep_pairs(x, y):
+    order = np.argsort(x, kind="stable")
+    xs = x[order]
+    ends = np.searchsorted(xs, xs + PLAYER_SIZE, "left")
+    counts = ends - np.arange(1, len(xs) + 1)
+    total = int(counts.sum())
+    first = np.repeat(np.arange(len(xs)), counts)
+    # Each candidate's offset past its first player: 1, 2, ... counts[i]
+    second = first + np.arange(1, total + 1) - np.repeat(np.cumsum(counts) - counts, counts)
+    ys = y[order]
+    hit = np.abs(ys[first] - ys[second]) < PLAYER_SIZE
+    return order[first[hit]], order[second[hit]]
+
+# Team match with any number of players per side, stored as packed arrays
+# (one entry per player). Team 0 defends flag1/base1 and captures flag2,
+# team 1 the reverse. With one player per side the rules and results are
+# exactly those of sim.step:
+#   - a player touching the enemy flag picks it up if nobody carries it
+#   - a carrier fully inside its own base scores
+#   - players of opposite teams who touch both drop any flag they carry
+class TeamMatch:
+    def __init__(self, level="FIRE", team_size=4, speed=3):
+        layout = load_level(level)
+        self.level = level
+        self.speed = speed
+        self.team_size = team_size
+        self.obstacles = np.array([tuple(obs) for obs in layout.obstacles] or np.zeros((0, 4)), dtype=np.int32)
+        self.bases = np.array([tuple(layout.base1), tuple(layout.base2)], dtype=np.int32)
+        self.flags = np.array([tuple(layout.flag1), tuple(layout.flag2)], dtype=np.int32)
+
+        spawns = (spawn_positions(layout.obstacles, layout.spawn1, team_size) +
+                  spawn_positions(layout.obstacles, layout.spawn2, team_size))
+        self.spawn = np.array(spawns, dtype=np.int32)
+        self.team = np.repeat(np.arange(2, dtype=np.int8), team_size)
+        self.x = self.spawn[:, 0].copy()
+        self.y = self.spawn[:, 1].copy()
+        self.holding = np.zeros(len(self.team), dtype=bool)
+        self.flag_taken = np.zeros(2, dtype=bool)  # by flag owner: flag1, flag2
+        self.score = np.zeros(2, dtype=np.int32)
+        self.tick = 0
+
+    def __len__(self):
+        return len(self.team)
+
+    # Winning team (0 or 1) or None
+    @property
+    def winner(self):
+        if self.score[0] >= WINNING_SCORE:
+            return 0
+        if self.score[1] >= WINNING_SCORE:
+            return 1
+        return None
+
+    # Advance one tick; inputs holds one movement bitmask per player
+    def step(self, inputs):
+        if self.winner is not None:
+            return
+        bits = np.asarray(inputs)
+        speed = self.speed
+        x, y = self.x, self.y
+        nx = x + np.where(bits & RIGHT, speed, 0) - np.where(bits & LEFT, speed, 0)
+        ny = y + np.where(bits & DOWN, speed, 0) - np.where(bits & UP, speed, 0)
+        np.clip(nx, 0, SCREEN_WIDTH - PLAYER_SIZE, out=nx)
+        np.clip(ny, 0, SCREEN_HEIGHT - PLAYER_SIZE, out=ny)
+        obs = self.obstacles
+        hit = _collide(nx[:, None], ny[:, None], PLAYER_SIZE, PLAYER_SIZE,
+                       obs[:, X], obs[:, Y], obs[:, W], obs[:, H]).any(axis=1)
+        self.x = x = np.where(hit, x, nx).astype(np.int32)
+        self.y = y = np.where(hit, y, ny).astype(np.int32)
+
+        # Flags: the lowest-numbered player touching a free enemy flag takes it
+        for team in (0, 1):
+            enemy = 1 - team
+            if self.flag_taken[enemy]:
+                continue
+            flag = self.flags[enemy]
+            touching = (self.team == team) & _collide(x, y, PLAYER_SIZE, PLAYER_SIZE,
+                                                      flag[X], flag[Y], flag[W], flag[H])
+            if touching.any():
+                self.holding[np.argmax(touching)] = True
+                self.flag_taken[enemy] = True
+
+        for team in (0, 1):
+            base = self.bases[team]
+            inside = ((base[X] <= x) & (base[Y] <= y) &
+                      (x + PLAYER_SIZE <= base[X] + base[W]) & (y + PLAYER_SIZE <= base[Y] + base[H]))
+            scored = self.holding & (self.team == team) & inside
+            if scored.any():
+                self.score[team] += 1
+                self.holding &= ~scored
+                self.flag_taken[1 - team] = False
+
+        # Tagging
+        first, second = overlapping_pairs(x, y)
+        opposed = self.team[first] != self.team[second]
+        tagged = np.zeros(len(self.team), dtype=bool)
+        tagged[first[opposed]] = True
+        tagged[second[opposed]] = True
+        dropped = tagged & self.holding
+        if dropped.any():
+            for team in self.team[dropped]:
+                self.flag_taken[1 - team] = False
+            self.holding &= ~tagged
+
+        self.tick += 1
+
+# Bots for every player of a team match, decided for all players at once
+# from the same distance-field move tables as bots.Bot: carriers head home,
+# defenders chase a nearby carrier of their flag or cut it off at the enemy
+# base, everyone else goes for the enemy flag.
+class TeamBots:
+    TARGETS = ("flag1", "flag2", "base1", "base2")
+
+    def __init__(self, match, rng=None, noise=0.0):
+        nav = nav_grid(match.level)
+        self.match = match
+        self.moves = np.stack([np.array(nav.moves[name], dtype=np.uint8) for name in self.TARGETS])
+        self.goals = np.array([nav.goals[name] for name in self.TARGETS], dtype=np.int32)
+        team = match.team.astype(np.intp)
+        self.enemy_flag = 1 - team  # flag1 is target 0, flag2 target 1
+        self.home = 2 + team
+        self.enemy_home = 3 - team
+        self.rng = np.random.default_rng(rng)
+        self.noise = noise
+        self.wander = np.zeros(len(match), dtype=np.int32)
+        self.wander_bits = np.zeros(len(match), dtype=np.uint8)
+        self.last_x = self.last_y = None
+        self.last_wanted = np.zeros(len(match), dtype=np.uint8)
+        self.slide = np.zeros(len(match), dtype=np.int32)
+
+    def __call__(self):
+        match = self.match
+        x, y, speed = match.x, match.y, match.speed
+        team = match.team
+
+        enemy_flag_free = ~match.flag_taken[1 - team]
+        target = np.where(match.holding, self.home, np.where(enemy_flag_free, self.enemy_flag, self.enemy_home))
+        cx = np.minimum(x // NAV_CELL, NAV_COLS - 1)
+        cy = np.minimum(y // NAV_CELL, NAV_ROWS - 1)
+        wanted = self.moves[target, cy, cx]
+        goal_x, goal_y = self.goals[target, 0], self.goals[target, 1]  # fancy indexing: fresh arrays
+
+        # The nearest defender within range of a carrier goes straight for
+        # it; the rest keep to their targets so one carrier does not pull
+        # the whole team off the flag
+        for carrier in np.nonzero(match.holding)[0]:
+            distance = np.maximum(np.abs(x - x[carrier]), np.abs(y - y[carrier]))
+            distance = np.where(team != team[carrier], distance, CHASE_RANGE)
+            chaser = np.argmin(distance)
+            if distance[chaser] < CHASE_RANGE:
+                wanted[chaser] = 0
+                goal_x[chaser] = x[carrier]
+                goal_y[chaser] = y[carrier]
+
+        # Final approach (and chasing): straight toward the goal position
+        dx, dy = goal_x - x, goal_y - y
+        toward = (np.where(dx >= speed, RIGHT, 0) | np.where(dx <= -speed, LEFT, 0) |
+                  np.where(dy >= speed, DOWN, 0) | np.where(dy <= -speed, UP, 0))
+        wanted = np.where(wanted == 0, toward, wanted).astype(np.uint8)
+
+        if self.noise:
+            start = (self.wander == 0) & (self.rng.random(len(match)) < self.noise)
+            self.wander_bits[start] = self.rng.integers(1, 16, int(start.sum()))
+            self.wander[start] = WANDER_TICKS
+            wandering = self.wander > 0
+            wanted = np.where(wandering, self.wander_bits, wanted)
+            self.wander -= wandering
+
+        # Moves rolled back by an obstacle are retried one axis at a time
+        if self.last_x is not None:
+            stuck = (wanted != 0) & (wanted == self.last_wanted) & (x == self.last_x) & (y == self.last_y)
+            self.slide = np.where(stuck, self.slide + 1, 0)
+        self.last_x, self.last_y, self.last_wanted = x, y, wanted
+        axis = np.where(self.slide % 2 == 1, UP | DOWN, LEFT | RIGHT)
+        slid = wanted & axis
+        return np.where((self.slide > 0) & (slid != 0), slid, wanted).astype(np.uint8)
+
+# Same inputs through TeamMatch with one player per side and through
+# sim.step; returns the number of ticks where the two disagree
+def check_one_on_one(level, speed, ticks, seed):
+    rng = random.Random(seed)
+    match = TeamMatch(level, 1, speed)
+    state = MatchState(level, speed)
+    mismatches = 0
+    bits = [0, 0]
+    for tick in range(ticks):
+        if tick % 20 == 0:
+            bits = [rng.randrange(16), rng.randrange(16)]
+        match.step(np.array(bits, dtype=np.uint8))
+        step(state, bits[0], bits[1])
+        ours = (int(match.x[0]), int(match.y[0]), int(match.x[1]), int(match.y[1]), bool(match.holding[0]),
+                bool(match.holding[1]), bool(match.flag_taken[0]), bool(match.flag_taken[1]),
+                int(match.score[0]), int(match.score[1]))
+        theirs = (state.player1.x, state.player1.y, state.player2.x, state.player2.y, state.holder_p1,
+                  state.holder_p2, state.flag1_captured, state.flag2_captured, state.score_p1, state.score_p2)
+        mismatches += ours != theirs
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot team matches without a window")
+    parser.add_argument("--level", default="FIRE", choices=sorted(LEVEL_OBSTACLES))
+    parser.add_argument("--team-size", type=int, default=8)
+    parser.add_argument("--speed", type=int, default=3)
+    parser.add_argument("--ticks", type=int, default=36000)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="compare one-on-one matches with sim.step")
+    args = parser.parse_args()
+
+    if args.check:
+        for level in LEVEL_OBSTACLES:
+            for speed in (3, 5, 7):
+                mismatches = check_one_on_one(level, speed, 20000, args.seed)
+                print(f"{level} speed {speed}: {mismatches} mismatching ticks")
+        return
+
+    match = TeamMatch(args.level, args.team_size, args.speed)
+    bots = TeamBots(match, args.seed, args.noise)
+    start = time.perf_counter()
+    while match.tick < args.ticks and match.winner is None:
+        match.step(bots())
+    elapsed = time.perf_counter() - start
+    print(f"{args.team_size}v{args.team_size} on {args.level}: {match.tick} ticks in {elapsed:.3f}s "
+          f"({elapsed / max(match.tick, 1) * 1e6:.0f} us per tick with bots)")
+    print(f"Score {match.score[0]} - {match.score[1]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import levelgen
+from bots import Bot, nav_grid
+from levels import LEVEL_OBSTACLES
+from sim import TICK_RATE, MatchState, step
+
+# Bot-vs-bot tournament over every level and speed setting, spread across a
+# process pool. Matches are handed out in batches and their results stream
+# back as each batch finishes.
+#
+#   python tournament.py --matches 500
+SPEEDS = (3, 5, 7)
+MAX_TICKS = TICK_RATE * 60 * 5  # a match still going after five minutes is a draw
+
+# Play one seeded match and return (level, speed, winner, ticks, capture
+# ticks, tags). winner is 1, 2 or 0 for a draw; capture ticks are the time
+# from each pickup to the score it led to; tags count carriers who lost the
+# flag to the other player.
+def play_match(level, speed, seed, noise, max_ticks):
+    rng = random.Random(seed)
+    bot1 = Bot(level, 1, rng, noise)
+    bot2 = Bot(level, 2, rng, noise)
+    state = MatchState(level, speed)
+    picked_p1 = picked_p2 = 0
+    captures = []
+    tags = 0
+    while state.tick < max_ticks and not state.winner:
+        held_p1, held_p2 = state.holder_p1, state.holder_p2
+        score_p1, score_p2 = state.score_p1, state.score_p2
+        step(state, bot1(state), bot2(state))
+
+        if state.score_p1 > score_p1:
+            captures.append(state.tick - picked_p1)
+        elif held_p1 and not state.holder_p1:
+            tags += 1
+        elif state.holder_p1 and not held_p1:
+            picked_p1 = state.tick
+
+        if state.score_p2 > score_p2:
+            captures.append(state.tick - picked_p2)
+        elif held_p2 and not state.holder_p2:
+            tags += 1
+        elif state.holder_p2 and not held_p2:
+            picked_p2 = state.tick
+
+    winner = 1 if state.score_p1 > state.score_p2 and state.winner else 2 if state.winner else 0
+    return level, speed, winner, state.tick, captures, tags
+
+def play_batch(matches, noise, max_ticks):
+    for level in {level for level, _, _ in matches}:
+        levelgen.register(level)
+    return [play_match(level, speed, seed, noise, max_ticks) for level, speed, seed in matches]
+
+class Tally:
+    def __init__(self):
+        self.matches = 0
+        self.wins = [0, 0, 0]  # draws, player 1, player 2
+        self.ticks = 0
+        self.captures = 0
+        self.capture_ticks = 0
+        self.tags = 0
+
+    def add(self, winner, ticks, captures, tags):
+        self.matches += 1
+        self.wins[winner] += 1
+        self.ticks += ticks
+        self.captures += len(captures)
+        self.capture_ticks += sum(captures)
+        self.tags += tags
+
+    def merge(self, other):
+        self.matches += other.matches
+        self.wins = [a + b for a, b in zip(self.wins, other.wins)]
+        self.ticks += other.ticks
+        self.captures += other.captures
+        self.capture_ticks += other.capture_ticks
+        self.tags += other.tags
+
+    def row(self, name):
+        n = max(self.matches, 1)
+        capture_s = self.capture_ticks / self.captures / TICK_RATE if self.captures else 0.0
+        return (f"{name:<12} {self.matches:>7} {self.wins[1] / n:>7.1%} {self.wins[2] / n:>7.1%} {self.wins[0] / n:>7.1%} "
+                f"{capture_s:>10.2f} {self.tags / n:>9.2f} {self.ticks / n / TICK_RATE:>9.1f}")
+
+HEADER = f"{'level':<12} {'matches':>7} {'p1 win':>7} {'p2 win':>7} {'draw':>7} {'capture s':>10} {'tags/match':>9} {'length s':>9}"
+
+def schedule(levels, speeds, matches, seed):
+    return [(level, speed, f"{seed}:{level}:{speed}:{i}")
+            for level in levels for speed in speeds for i in range(matches)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot-vs-bot tournament across levels and speeds")
+    parser.add_argument("--matches", type=int, default=200, help="matches per level and speed")
+    parser.add_argument("--levels", nargs="+", default=sorted(LEVEL_OBSTACLES), choices=sorted(LEVEL_OBSTACLES))
+    parser.add_argument("--speeds", nargs="+", type=int, default=list(SPEEDS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch", type=int, default=20, help="matches handed to a worker at a time")
+    parser.add_argument("--noise", type=float, default=0.02, help="chance per tick of a bot wandering off")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument("--generated", type=int, default=0, help="also play this many generated levels")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.levels += [levelgen.generated_level(args.seed + i) for i in range(args.generated)]
+
+    # Build any missing navigation caches once, before the workers load them
+    for level in args.levels:
+        nav_grid(level)
+
+    matches = schedule(args.levels, args.speeds, args.matches, args.seed)
+    batches = [matches[i:i + args.batch] for i in range(0, len(matches), args.batch)]
+    tallies = {(level, speed): Tally() for level in args.levels for speed in args.speeds}
+
+    start = time.perf_counter()
+    done = ticks = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(play_batch, batch, args.noise, args.max_ticks) for batch in batches]
+        for future in as_completed(futures):
+            for level, speed, winner, match_ticks, captures, tags in future.result():
+                tallies[level, speed].add(winner, match_ticks, captures, tags)
+                ticks += match_ticks
+            done += 1
+            print(f"\r{done}/{len(batches)} batches", end="", file=sys.stderr, flush=True)
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+
+    print(HEADER)
+    for level in args.levels:
+        total = Tally()
+        for speed in args.speeds:
+            tally = tallies[level, speed]
+            print(tally.row(f"{level} x{speed}"))
+            total.merge(tally)
+        print(total.row(level))
+        print()
+    print(f"{len(matches)} matches ({ticks:,} ticks) in {elapsed:.1f}s on {args.workers} workers: "
+          f"{len(matches) / elapsed:,.1f} matches/s, {ticks / elapsed:,.0f} ticks/s")
+
+if __name__ == "__main__":
+    main()
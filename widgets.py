@@ -0,0 +1,104 @@
+import pygame
+
+from render import render_text
+
+# Retained-mode menu widgets. A Button keeps its normal and hover looks as
+# pre-rendered surfaces and only draws them again when what it shows
+# changes: its label (which may follow a setting, like "Speed: 5"), its
+# colors (which follow dark mode) or the font. Clicks come from
+# MOUSEBUTTONDOWN events passed to handle_event(), so an action runs once
+# per press, before the frame that shows its result is drawn, and nothing
+# polls the mouse buttons or waits.
+class Button:
+    # text is a string or a function returning the current label; colors
+    # is a (fill, label, hover fill, hover border) tuple or a function
+    # returning one, with None for no hover border
+    def __init__(self, rect, text, action=None, colors=None, radius=0, border=2):
+        self.rect = pygame.Rect(rect)
+        self.text = text
+        self.action = action
+        self.colors = colors
+        self.radius = radius
+        self.border = border
+        self._key = None
+        self._normal = None
+        self._hover = None
+
+    @property
+    def label(self):
+        return self.text() if callable(self.text) else self.text
+
+    def _colors(self):
+        return self.colors() if callable(self.colors) else self.colors
+
+    # (normal, hover) surfaces, rendered again only when the label, colors
+    # or font changed since the last call
+    def surfaces(self, font):
+        label, colors = self.label, self._colors()
+        if self._key is None or self._key[0] is not font or self._key[1] != label or self._key[2] != colors:
+            self._key = (font, label, colors)
+            self._normal = self._render(font, label, colors, False)
+            self._hover = self._render(font, label, colors, True)
+        return self._normal, self._hover
+
+    # Opaque surfaces blit several times faster than per-pixel alpha, so the
+    # rounded corners are cut out with a color key when one can be found
+    def _render(self, font, label, colors, hover):
+        fill, text_color, hover_fill, hover_border = colors
+        key = _key_color(colors) if self.radius else None
+        if self.radius and key is None:
+            surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        else:
+            surface = pygame.Surface(self.rect.size)
+            if key is not None:
+                surface.fill(key)
+        area = surface.get_rect()
+        pygame.draw.rect(surface, hover_fill if hover else fill, area, border_radius=self.radius)
+        text = render_text(font, label, text_color)
+        surface.blit(text, text.get_rect(center=area.center))
+        if hover and hover_border is not None:
+            pygame.draw.rect(surface, hover_border, area, self.border, border_radius=self.radius)
+        if pygame.display.get_surface():
+            surface = surface.convert_alpha() if surface.get_flags() & pygame.SRCALPHA else surface.convert()
+        if key is not None:
+            surface.set_colorkey(key, pygame.RLEACCEL)
+        return surface
+
+    def draw(self, surface, font, mouse=None):
+        normal, hover = self.surfaces(font)
+        if mouse is None:
+            mouse = pygame.mouse.get_pos()
+        surface.blit(hover if self.rect.collidepoint(mouse) else normal, self.rect)
+
+    # Run the action for a left click on the button; True if it took the event
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.rect.collidepoint(event.pos):
+            if self.action:
+                self.action()
+            return True
+        return False
+
+# A color no pixel of a button can have: in some channel it lies outside
+# the range of all the button's colors, and so of its label's antialiased
+# edges too. None if every channel spans 0 to 255.
+def _key_color(colors):
+    colors = [color for color in colors if color is not None]
+    for channel in range(3):
+        values = [color[channel] for color in colors]
+        if min(values) > 0 or max(values) < 255:
+            key = [0, 0, 0]
+            key[channel] = 0 if min(values) > 0 else 255
+            return tuple(key)
+    return None
+
+def draw_buttons(surface, buttons, font):
+    mouse = pygame.mouse.get_pos()
+    for button in buttons:
+        button.draw(surface, font, mouse)
+
+# Give a click to the first button under it; True if one took it
+def dispatch(buttons, event):
+    for button in buttons:
+        if button.handle_event(event):
+            return True
+    return False